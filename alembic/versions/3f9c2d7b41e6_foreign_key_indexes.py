@@ -0,0 +1,36 @@
+"""foreign key indexes
+
+Revision ID: 3f9c2d7b41e6
+Revises: 7360cbbaf1b9
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7b41e6'
+down_revision: Union[str, None] = '7360cbbaf1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block; building
+    # the indexes concurrently keeps the tables writable while they are built.
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_products_category_id'), 'products', ['category_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_order_products_product_id'), 'order_products', ['product_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_order_products_order_id_product_id', 'order_products', ['order_id', 'product_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_order_products_order_id_product_id', table_name='order_products', postgresql_concurrently=True)
+        op.drop_index('ix_orders_user_id_created_at', table_name='orders', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_order_products_product_id'), table_name='order_products', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_products_category_id'), table_name='products', postgresql_concurrently=True)
@@ -0,0 +1,27 @@
+"""user token version
+
+Revision ID: b84e1f0c5d27
+Revises: 3f9c2d7b41e6
+Create Date: 2026-10-17 14:05:19.604817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b84e1f0c5d27'
+down_revision: Union[str, None] = '3f9c2d7b41e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A constant server default lets PostgreSQL add the column without rewriting the table
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
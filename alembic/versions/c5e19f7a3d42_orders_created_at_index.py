@@ -0,0 +1,29 @@
+"""orders created_at index
+
+Revision ID: c5e19f7a3d42
+Revises: a7d4e2b8c613
+Create Date: 2026-10-18 10:14:37.209581
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e19f7a3d42'
+down_revision: Union[str, None] = 'a7d4e2b8c613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Lets the unfiltered order list page by (created_at, id) without sorting the table
+    with op.get_context().autocommit_block():
+        op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_created_at_id', table_name='orders', postgresql_concurrently=True)
@@ -0,0 +1,26 @@
+"""order events sequence
+
+Revision ID: d1a7c3e9f205
+Revises: b84e1f0c5d27
+Create Date: 2026-10-17 16:22:47.150362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1a7c3e9f205'
+down_revision: Union[str, None] = 'b84e1f0c5d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('order_events_seq')))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('order_events_seq')))
@@ -0,0 +1,32 @@
+"""order history index
+
+Revision ID: f3c8a1d6b920
+Revises: e62b9d4a8c13
+Create Date: 2026-10-17 21:04:13.582716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a1d6b920'
+down_revision: Union[str, None] = 'e62b9d4a8c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Ending the index with the primary key lets keyset pages on (created_at, id)
+    # seek within a user's orders; the old index is dropped once the new one is built.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_orders_user_id_created_at_id', 'orders', ['user_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_orders_user_id_created_at', table_name='orders', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_orders_user_id_created_at_id', table_name='orders', postgresql_concurrently=True)
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from apps.carts.schemas import CartItemAdd, CartItemUpdate, CartRead
+from apps.carts.services import CartService, get_cart_service
+from apps.orders.schemas import OrderRead
+from core.dependencies import Principal, UserHandling
+
+router = APIRouter()
+
+@router.get("/", response_model=CartRead)
+async def get_cart(
+        service: CartService = Depends(get_cart_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Retrieve the authenticated user's cart.
+
+    :param service: The cart service dependency.
+    :param user: The authenticated user.
+    :return: The cart, possibly empty.
+    """
+    return await service.get_cart(user.id)
+
+@router.post("/items", response_model=CartRead)
+async def add_cart_item(
+        item: CartItemAdd,
+        service: CartService = Depends(get_cart_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Add a quantity of a product to the authenticated user's cart.
+
+    :param item: The product and the quantity to add.
+    :param service: The cart service dependency.
+    :param user: The authenticated user.
+    :return: The updated cart.
+    """
+    return await service.add_item(user.id, item)
+
+@router.patch("/items/{product_id}", response_model=CartRead)
+async def update_cart_item(
+        product_id: int,
+        data: CartItemUpdate,
+        service: CartService = Depends(get_cart_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Set the quantity of a product in the authenticated user's cart; 0 removes it.
+
+    :param product_id: The ID of the product.
+    :param data: The new quantity.
+    :param service: The cart service dependency.
+    :param user: The authenticated user.
+    :return: The updated cart if the product is in it, otherwise raises a 404 error.
+    """
+    cart = await service.update_item(user.id, product_id, data)
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Product not in cart")
+    return cart
+
+@router.delete("/items/{product_id}", response_model=CartRead)
+async def remove_cart_item(
+        product_id: int,
+        service: CartService = Depends(get_cart_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Remove a product from the authenticated user's cart.
+
+    :param product_id: The ID of the product.
+    :param service: The cart service dependency.
+    :param user: The authenticated user.
+    :return: The updated cart if the product was in it, otherwise raises a 404 error.
+    """
+    cart = await service.remove_item(user.id, product_id)
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Product not in cart")
+    return cart
+
+@router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_cart(
+        service: CartService = Depends(get_cart_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Empty the authenticated user's cart.
+
+    :param service: The cart service dependency.
+    :param user: The authenticated user.
+    """
+    await service.clear_cart(user.id)
+
+@router.post("/checkout", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
+async def checkout(
+        service: CartService = Depends(get_cart_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Turn the authenticated user's cart into an order.
+
+    :param service: The cart service dependency.
+    :param user: The authenticated user.
+    :return: The created order.
+    """
+    return await service.checkout(user.id)
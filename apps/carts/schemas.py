@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from core.config import settings
+
+class CartItemAdd(BaseModel):
+    product_id: int
+    quantity: int = Field(default=1, ge=1, le=settings.CART_MAX_QUANTITY)
+
+class CartItemUpdate(BaseModel):
+    # A quantity of 0 removes the item
+    quantity: int = Field(..., ge=0, le=settings.CART_MAX_QUANTITY)
+
+class CartItemRead(BaseModel):
+    product_id: int
+    quantity: int
+
+class CartRead(BaseModel):
+    user_id: int
+    items: list[CartItemRead]
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import Integer, any_, delete, event, func, literal, select, true
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from apps.carts.schemas import CartItemAdd, CartItemRead, CartItemUpdate, CartRead
+from apps.carts.store import CartStore, Items, cart_store
+from apps.orders.schemas import OrderCreate, OrderRead
+from apps.orders.services import OrderService
+from apps.products.services import ProductService
+from core.config import settings
+from core.connections import Connection, get_session
+from core.models import Cart, CartItem, Product, User
+
+logger = logging.getLogger(__name__)
+
+# Seconds between purges of the persisted carts abandoned for CART_RETENTION_DAYS
+PURGE_INTERVAL = 3600.0
+# Carts being emptied after a checkout committed, referenced until done
+_emptying: set[asyncio.Task] = set()
+
+
+def _track(task: asyncio.Task) -> None:
+    _emptying.add(task)
+    task.add_done_callback(_emptying.discard)
+
+
+def check_size(items: Items) -> None:
+    """
+    Reject a cart holding more of a product than CART_MAX_QUANTITY or more units
+    than CART_MAX_UNITS, which bound the line items written at checkout.
+
+    :param items: The quantities by product ID.
+    """
+    if any(quantity > settings.CART_MAX_QUANTITY for quantity in items.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.CART_MAX_QUANTITY} units of a product fit in a cart"
+        )
+    if sum(items.values()) > settings.CART_MAX_UNITS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.CART_MAX_UNITS} units fit in a cart"
+        )
+
+
+def to_cart_read(user_id: int, items: Items) -> CartRead:
+    return CartRead(
+        user_id=user_id,
+        items=[CartItemRead(product_id=product_id, quantity=quantity) for product_id, quantity in items.items()],
+    )
+
+
+class CartService:
+    """
+    Service class to handle operations related to carts.
+
+    Carts are read from and written to the cart store; Postgres is only read when
+    a cart is not in the store, and only written by `flush_carts` and checkout.
+    """
+
+    def __init__(self, session: AsyncSession, store: CartStore = cart_store):
+        """
+        Initialize the CartService with a database session and a cart store.
+
+        :param session: An asynchronous database session.
+        :param store: The store holding the carts being edited.
+        """
+        self.session = session
+        self.store = store
+
+    async def _items(self, user_id: int) -> Items:
+        """
+        Retrieve the items of a cart, loading the persisted cart into the store on a miss.
+
+        :param user_id: The ID of the cart's user.
+        :return: The cart items, product ID -> quantity.
+        """
+        items = await self.store.get(user_id)
+        if items is None:
+            result = await self.session.execute(
+                select(CartItem.product_id, CartItem.quantity).join(Cart).where(Cart.user_id == user_id)
+            )
+            # A concurrent request may have loaded and changed the cart while this one
+            # waited for the query; its cart wins over the rows read here
+            items = await self.store.setdefault(user_id, dict(result.tuples().all()))
+        return items
+
+    async def get_cart(self, user_id: int) -> CartRead:
+        """
+        Retrieve a user's cart.
+
+        :param user_id: The ID of the user.
+        :return: The cart, possibly empty.
+        """
+        return to_cart_read(user_id, await self._items(user_id))
+
+    async def add_item(self, user_id: int, item: CartItemAdd) -> CartRead:
+        """
+        Add a quantity of a product to a user's cart.
+
+        :param user_id: The ID of the user.
+        :param item: The product and the quantity to add.
+        :return: The updated cart.
+        """
+        if await ProductService(self.session).get_product_by_id(item.product_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        items = await self._items(user_id)
+        items[item.product_id] = items.get(item.product_id, 0) + item.quantity
+        check_size(items)
+        await self.store.set(user_id, items)
+        return to_cart_read(user_id, items)
+
+    async def update_item(self, user_id: int, product_id: int, data: CartItemUpdate) -> CartRead | None:
+        """
+        Set the quantity of a product in a user's cart, removing it at zero.
+
+        :param user_id: The ID of the user.
+        :param product_id: The ID of the product.
+        :param data: The new quantity.
+        :return: The updated cart, or None when the product is not in the cart.
+        """
+        items = await self._items(user_id)
+        if product_id not in items:
+            return None
+        if data.quantity:
+            items[product_id] = data.quantity
+            check_size(items)
+        else:
+            del items[product_id]
+        await self.store.set(user_id, items)
+        return to_cart_read(user_id, items)
+
+    async def remove_item(self, user_id: int, product_id: int) -> CartRead | None:
+        """
+        Remove a product from a user's cart.
+
+        :param user_id: The ID of the user.
+        :param product_id: The ID of the product.
+        :return: The updated cart, or None when the product is not in the cart.
+        """
+        return await self.update_item(user_id, product_id, CartItemUpdate(quantity=0))
+
+    async def clear_cart(self, user_id: int) -> None:
+        """
+        Empty a user's cart. The persisted cart is deleted by the next flush.
+
+        :param user_id: The ID of the user.
+        """
+        await self.store.set(user_id, {})
+
+    async def checkout(self, user_id: int) -> OrderRead:
+        """
+        Turn a user's cart into an order and empty the cart.
+
+        :param user_id: The ID of the user.
+        :return: The created order.
+        """
+        items = await self._items(user_id)
+        if not items:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+        # Carts persisted before the limits existed may still exceed them
+        check_size(items)
+        # Order line items have no quantity, so a product is listed once per unit
+        product_ids = [product_id for product_id, quantity in items.items() for _ in range(quantity)]
+        order = await OrderService(self.session).create_order(OrderCreate(user_id=user_id, product_ids=product_ids))
+        # The cart is only emptied once the order is committed, so a failed commit keeps it
+        event.listen(
+            self.session.sync_session,
+            "after_commit",
+            lambda session: _track(asyncio.ensure_future(self._empty_ordered(user_id, items))),
+            once=True,
+        )
+        return order
+
+    async def _empty_ordered(self, user_id: int, ordered: Items) -> None:
+        """
+        Empty a cart after checkout, unless it was changed since it was ordered.
+
+        :param user_id: The ID of the cart's user.
+        :param ordered: The items that were ordered.
+        """
+        if await self.store.get(user_id) == ordered:
+            await self.store.set(user_id, {})
+
+    async def persist(self, carts: dict[int, Items]) -> None:
+        """
+        Write carts to Postgres with a fixed number of statements, whatever their count.
+
+        Empty carts are deleted. Carts of deleted users and items of deleted
+        products are skipped rather than failing the whole batch.
+
+        :param carts: The carts to write, keyed by user ID.
+        """
+        now = datetime.now()
+        empty = [user_id for user_id, items in carts.items() if not items]
+        filled = [user_id for user_id, items in carts.items() if items]
+        if empty:
+            await self.session.execute(delete(Cart).where(Cart.user_id == any_(literal(empty, ARRAY(Integer)))))
+        if not filled:
+            return
+        upsert = insert(Cart).from_select(
+            ["user_id", "created_at", "updated_at", "is_active"],
+            select(User.id, literal(now), literal(now), true()).where(User.id == any_(literal(filled, ARRAY(Integer)))),
+        )
+        result = await self.session.execute(
+            upsert.on_conflict_do_update(index_elements=[Cart.user_id], set_={"updated_at": now})
+            .returning(Cart.id, Cart.user_id)
+        )
+        cart_ids = {user_id: cart_id for cart_id, user_id in result.tuples()}
+        if not cart_ids:
+            return
+        await self.session.execute(
+            delete(CartItem).where(CartItem.cart_id == any_(literal(list(cart_ids.values()), ARRAY(Integer))))
+        )
+        rows = [
+            (cart_id, product_id, quantity)
+            for user_id, cart_id in cart_ids.items()
+            for product_id, quantity in carts[user_id].items()
+        ]
+        cart_column, product_column, quantity_column = (list(column) for column in zip(*rows))
+        unnested = select(
+            func.unnest(literal(cart_column, ARRAY(Integer))).label("cart_id"),
+            func.unnest(literal(product_column, ARRAY(Integer))).label("product_id"),
+            func.unnest(literal(quantity_column, ARRAY(Integer))).label("quantity"),
+        ).subquery()
+        await self.session.execute(
+            insert(CartItem).from_select(
+                ["cart_id", "product_id", "quantity", "created_at", "updated_at", "is_active"],
+                select(
+                    unnested.c.cart_id, unnested.c.product_id, unnested.c.quantity,
+                    literal(now), literal(now), true(),
+                ).join(Product, Product.id == unnested.c.product_id),
+            )
+        )
+
+    async def purge_abandoned(self) -> None:
+        """
+        Delete the persisted carts untouched for CART_RETENTION_DAYS.
+        """
+        cutoff = datetime.now() - timedelta(days=settings.CART_RETENTION_DAYS)
+        await self.session.execute(delete(Cart).where(Cart.updated_at < cutoff))
+
+
+async def flush_carts(store: CartStore = cart_store) -> int:
+    """
+    Persist the carts changed since the last flush in one transaction.
+
+    :param store: The cart store to flush.
+    :return: The number of carts written.
+    """
+    carts = await store.take_dirty()
+    if not carts:
+        return 0
+    try:
+        async with Connection()._session_factory() as session:
+            async with session.begin():
+                await CartService(session, store).persist(carts)
+    except (SQLAlchemyError, OSError):
+        # Keep the carts dirty so the next flush retries them
+        await store.mark_dirty(carts)
+        raise
+    return len(carts)
+
+
+async def run_cart_flusher(store: CartStore = cart_store) -> None:
+    """
+    Flush dirty carts every CART_FLUSH_INTERVAL seconds and evict abandoned ones.
+    Runs until cancelled, then flushes one last time.
+    """
+    purged_at = 0.0
+    try:
+        while True:
+            await asyncio.sleep(settings.CART_FLUSH_INTERVAL)
+            try:
+                await flush_carts(store)
+                await store.evict_expired()
+                if time.monotonic() - purged_at >= PURGE_INTERVAL:
+                    async with Connection()._session_factory() as session:
+                        async with session.begin():
+                            await CartService(session, store).purge_abandoned()
+                    purged_at = time.monotonic()
+            except (SQLAlchemyError, OSError) as e:
+                logger.warning("Cart flush failed, retrying in %ss: %s", settings.CART_FLUSH_INTERVAL, e)
+    except asyncio.CancelledError:
+        await flush_carts(store)
+        raise
+
+
+def get_cart_service(session: AsyncSession = Depends(get_session)) -> CartService:
+    """
+    Dependency to get a CartService instance with a session.
+
+    :param session: An asynchronous database session.
+    :return: A CartService instance.
+    """
+    return CartService(session)
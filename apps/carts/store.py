@@ -0,0 +1,135 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from core.config import settings
+
+# A cart as stored: product ID -> quantity
+Items = dict[int, int]
+
+
+class CartStore(ABC):
+    """
+    Key-value storage of the carts being edited, keyed by user ID.
+
+    Cart mutations only touch the store; carts marked dirty are persisted to
+    Postgres in the background by `apps.carts.services.flush_carts`.
+    """
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Items | None:
+        ...
+
+    @abstractmethod
+    async def set(self, user_id: int, items: Items, dirty: bool = True) -> None:
+        ...
+
+    @abstractmethod
+    async def setdefault(self, user_id: int, items: Items) -> Items:
+        """
+        Store a clean cart loaded from Postgres unless the user already has one in the store.
+
+        :return: A copy of the cart now in the store.
+        """
+
+    @abstractmethod
+    async def take_dirty(self) -> dict[int, Items]:
+        """
+        :return: The carts changed since the previous call, which are now marked clean.
+        """
+
+    @abstractmethod
+    async def mark_dirty(self, carts: dict[int, Items]) -> None:
+        """
+        Mark carts dirty again after a failed flush.
+        """
+
+    @abstractmethod
+    async def evict_expired(self) -> int:
+        """
+        :return: The number of abandoned carts evicted.
+        """
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCartStore(CartStore):
+    """
+    An in-process LRU cart store whose idle carts expire after a TTL.
+
+    Only clean carts are evicted, so a cart is never dropped before it has been
+    persisted; the store may briefly exceed `maxsize` while many carts are dirty.
+    With several workers, a user's requests must reach the same worker.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: The number of carts kept in memory.
+        :param ttl: Seconds after its last change a cart is evicted from memory.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._carts: OrderedDict[int, tuple[Items, float]] = OrderedDict()
+        self._dirty: set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: int) -> Items | None:
+        entry = self._carts.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._carts.move_to_end(user_id)
+        # Callers get a copy they may change before storing it back
+        return dict(entry[0])
+
+    async def set(self, user_id: int, items: Items, dirty: bool = True) -> None:
+        self._carts[user_id] = (dict(items), time.monotonic() + self.ttl)
+        self._carts.move_to_end(user_id)
+        if dirty:
+            self._dirty.add(user_id)
+        if len(self._carts) > self.maxsize:
+            self._evict_clean(len(self._carts) - self.maxsize)
+
+    async def setdefault(self, user_id: int, items: Items) -> Items:
+        if user_id not in self._carts:
+            await self.set(user_id, items, dirty=False)
+        return await self.get(user_id)
+
+    async def take_dirty(self) -> dict[int, Items]:
+        dirty = {user_id: dict(self._carts[user_id][0]) for user_id in self._dirty if user_id in self._carts}
+        self._dirty.clear()
+        return dirty
+
+    async def mark_dirty(self, carts: dict[int, Items]) -> None:
+        for user_id, items in carts.items():
+            if user_id not in self._carts:
+                self._carts[user_id] = (items, time.monotonic() + self.ttl)
+            self._dirty.add(user_id)
+
+    async def evict_expired(self) -> int:
+        now = time.monotonic()
+        expired = [
+            user_id for user_id, (_, expires_at) in self._carts.items()
+            if expires_at <= now and user_id not in self._dirty
+        ]
+        for user_id in expired:
+            del self._carts[user_id]
+        return len(expired)
+
+    def _evict_clean(self, count: int) -> None:
+        # Least recently used first, skipping the carts that still need a flush
+        for user_id in [user_id for user_id in self._carts if user_id not in self._dirty][:count]:
+            del self._carts[user_id]
+
+    def stats(self) -> dict:
+        return {"carts": len(self._carts), "dirty": len(self._dirty), "hits": self.hits, "misses": self.misses}
+
+
+def create_cart_store() -> CartStore:
+    return MemoryCartStore(settings.CART_STORE_SIZE, settings.CART_TTL)
+
+
+# The cart store of this worker
+cart_store = create_cart_store()
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List
 from apps.categories.schemas import CategoryCreate, CategoryRead, CategoryUpdate, CategoryPatch
 from apps.categories.services import CategoryService, get_category_service
-from core.dependencies import UserHandling
-from core.models import User
+from core.dependencies import Principal, UserHandling
+from core.etag import table_etag
+from core.multiget import MultiGet, build_multiget, parse_ids
+from core.pagination import Page
 
 router = APIRouter()
 
@@ -11,7 +12,7 @@ router = APIRouter()
 async def create_category(
         category: CategoryCreate,
         service: CategoryService = Depends(get_category_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Create a new category.
@@ -23,30 +24,52 @@ async def create_category(
     """
     return await service.create_category(category)
 
-@router.get("/categories", response_model=List[CategoryRead])
+@router.get("/categories", response_model=Page[CategoryRead])
 async def read_categories(
-        page: int = Query(1, ge=1),
+        cursor: str | None = Query(None),
         size: int = Query(10, ge=1, le=100),
         service: CategoryService = Depends(get_category_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal),
+        etag: None = Depends(table_etag("categories"))
 ):
     """
-    Retrieve a list of categories with pagination.
+    Retrieve a page of categories.
 
-    :param page: The page number to retrieve.
+    :param cursor: The `next_cursor` of the previous page, omitted for the first page.
     :param size: The number of categories per page.
     :param service: The category service dependency.
     :param user: The authenticated user.
-    :return: A list of categories.
+    :param etag: Answers 304 when the client's copy is current.
+    :return: A page of categories and the cursor of the next page.
     """
-    categories = await service.get_categories(page, size)
+    categories = await service.get_categories(cursor, size)
     return categories
 
+@router.get("/categories/batch", response_model=MultiGet[CategoryRead])
+async def read_categories_batch(
+        ids: list[int] = Depends(parse_ids),
+        service: CategoryService = Depends(get_category_service),
+        user: Principal = Depends(UserHandling().principal),
+        etag: None = Depends(table_etag("categories")),
+):
+    """
+    Retrieve several categories by ID with a single query.
+
+    :param ids: The comma-separated IDs of the categories, at most MULTI_GET_MAX_IDS.
+    :param service: The category service dependency.
+    :param user: The authenticated user.
+    :param etag: Answers 304 when the client's copy is current.
+    :return: The categories in request order, null for each ID not found, and the missing IDs.
+    """
+    found = await service.loader.load_many(ids)
+    return build_multiget(ids, found, CategoryRead.model_validate)
+
 @router.get("/categories/{category_id}", response_model=CategoryRead)
 async def read_category(
         category_id: int,
         service: CategoryService = Depends(get_category_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal),
+        etag: None = Depends(table_etag("categories"))
 ):
     """
     Retrieve a category by its ID.
@@ -54,6 +77,7 @@ async def read_category(
     :param category_id: The ID of the category to retrieve.
     :param service: The category service dependency.
     :param user: The authenticated user.
+    :param etag: Answers 304 when the client's copy is current.
     :return: The category if found, otherwise raises a 404 error.
     """
     category = await service.get_category_by_id(category_id)
@@ -66,7 +90,7 @@ async def update_category(
         category_id: int,
         data: CategoryUpdate,
         service: CategoryService = Depends(get_category_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Update a category by its ID.
@@ -87,7 +111,7 @@ async def patch_category(
         category_id: int,
         data: CategoryPatch,
         service: CategoryService = Depends(get_category_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Partially update a category by its ID.
@@ -107,7 +131,7 @@ async def patch_category(
 async def delete_category(
         category_id: int,
         service: CategoryService = Depends(get_category_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Delete a category by its ID.
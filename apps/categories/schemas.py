@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from core.updates import not_null
 
 class CategoryBase(BaseModel):
     name: str
@@ -8,10 +9,15 @@ class CategoryCreate(CategoryBase):
     pass
 
 class CategoryRead(CategoryBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
 
 class CategoryUpdate(CategoryBase):
     pass
 
-class CategoryPatch(CategoryBase):
-    pass
+class CategoryPatch(BaseModel):
+    name: str | None = None
+    description: str | None = None
+
+    _not_null = not_null("name")
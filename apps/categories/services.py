@@ -1,10 +1,15 @@
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import Integer, any_, delete, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
 from apps.categories.schemas import CategoryCreate, CategoryRead, CategoryUpdate, CategoryPatch
 from core.connections import get_session
+from core.loader import BatchLoader, batch_loader
+from core.replicas import read_only
+from core.singleflight import singleflight
 from core.models import Category
+from core.pagination import Page, build_page, keyset
+from core.updates import update_by_id
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
 
 
 class CategoryService:
@@ -27,94 +32,83 @@ class CategoryService:
         :param category: The category data to create.
         :return: The created category.
         """
-        async with self.session:
-            self.session.add(category)
-            await self.session.commit()
-            await self.session.refresh(category)
-        return category
+        return await self.session.scalar(insert(Category).values(**category.model_dump()).returning(Category))
 
-    async def get_categories(self, page: int, size: int) -> List[CategoryRead]:
+    @read_only
+    async def get_categories(self, cursor: str | None, size: int) -> Page[CategoryRead]:
         """
-        Retrieve a list of categories with pagination.
+        Retrieve a page of categories using keyset pagination.
 
-        :param page: The page number to retrieve.
+        :param cursor: The cursor returned with the previous page, if any.
         :param size: The number of categories per page.
-        :return: A list of categories.
+        :return: A page of categories.
         """
-        async with self.session:
-            result = await self.session.execute(select(Category).offset((page - 1) * size).limit(size))
-        return result.scalars().all()
+        result = await self.session.execute(keyset(select(Category), [Category.id], cursor, size))
+        return build_page(result.scalars().all(), size, ["id"], CategoryRead.model_validate)
 
+    @property
+    def loader(self) -> BatchLoader:
+        """
+        The request's batch loader of categories by ID.
+        """
+        return batch_loader(self.session, "categories", self.get_categories_by_ids)
+
+    @read_only
+    async def get_categories_by_ids(self, category_ids: list[int]) -> dict[int, CategoryRead]:
+        """
+        Retrieve several categories with a single query.
+
+        :param category_ids: The IDs of the categories to retrieve.
+        :return: The found categories by ID.
+        """
+        result = await self.session.execute(
+            select(Category).where(Category.id == any_(literal(category_ids, ARRAY(Integer))))
+        )
+        return {category.id: CategoryRead.model_validate(category) for category in result.scalars()}
+
+    @read_only
+    @singleflight
     async def get_category_by_id(self, category_id: int) -> CategoryRead | None:
         """
-        Retrieve a category by its ID.
+        Retrieve a category by its ID, batched with the other categories requested
+        in the same event-loop iteration.
 
         :param category_id: The ID of the category to retrieve.
         :return: The category if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Category).where(Category.id == category_id))
-        return result.scalar_one_or_none()
+        return await self.loader.load(category_id)
 
     async def update_category(self, category_id: int, data: CategoryUpdate) -> CategoryRead | None:
         """
-        Update a category by its ID.
+        Update a category by its ID with a single UPDATE ... RETURNING.
 
         :param category_id: The ID of the category to update.
-        :param data: The updated category data.
+        :param data: The updated category data; fields left as None are not changed.
         :return: The updated category if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Category).where(Category.id == category_id))
-        category = result.scalar_one_or_none()
-        if category is None:
-            return None
-        for key, value in data.model_dump().items():
-            if value is not None:
-                setattr(category, key, value)
-        async with self.session:
-            self.session.add(category)
-            await self.session.commit()
-            await self.session.refresh(category)
-        return category
+        return await self._update(category_id, data.model_dump(exclude_none=True))
 
     async def patch_category(self, category_id: int, data: CategoryPatch) -> CategoryRead | None:
         """
-        Partially update a category by its ID.
+        Partially update a category by its ID with a single UPDATE ... RETURNING.
 
         :param category_id: The ID of the category to patch.
-        :param data: The partial category data to update.
+        :param data: The partial category data; only the fields that were sent are changed.
         :return: The updated category if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Category).where(Category.id == category_id))
-        category = result.scalar_one_or_none()
-        if category is None:
-            return None
-        for key, value in data.model_dump().items():    
-            if value is not None:
-                setattr(category, key, value)
-        async with self.session:
-            self.session.add(category)
-            await self.session.commit()
-            await self.session.refresh(category)
-        return category 
-    
+        return await self._update(category_id, data.model_dump(exclude_unset=True))
+
+    async def _update(self, category_id: int, values: dict) -> CategoryRead | None:
+        return await self.session.scalar(update_by_id(Category, category_id, values).returning(Category))
+
     async def delete_category(self, category_id: int) -> None:
         """
         Delete a category by its ID.
 
         :param category_id: The ID of the category to delete.
         """
-        async with self.session:
-            result = await self.session.execute(select(Category).where(Category.id == category_id))
-        category = result.scalar_one_or_none()  
-        if category is None:
-            return None
-        async with self.session:
-            await self.session.delete(category)
-            await self.session.commit()
-            
+        await self.session.execute(delete(Category).where(Category.id == category_id))
+
 
 def get_category_service(session: AsyncSession = Depends(get_session)) -> CategoryService:
     """
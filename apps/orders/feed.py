@@ -0,0 +1,216 @@
+import asyncio
+import json
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Iterable
+from sqlalchemy import text
+from core.config import settings
+from core.connections import Connection
+from core.pubsub import backplane
+
+# Backplane channel carrying the order change events of every worker
+ORDER_EVENTS_CHANNEL = "orders"
+# Sent instead of events when a client cannot be caught up and has to refetch
+RESET = {"type": "reset"}
+
+
+def format_position(seq: int, missing: Iterable[int]) -> str:
+    """
+    Encode a feed position, sent to clients as the SSE event ID and as the
+    `position` of each event, and passed back to resume.
+
+    :param seq: The highest sequence number received.
+    :param missing: Lower sequence numbers that had not arrived yet.
+    :return: The sequence number, followed by the missing ones if any, e.g. "12:9,10".
+    """
+    return f"{seq}:{','.join(map(str, sorted(missing)))}" if missing else str(seq)
+
+
+def parse_position(value: str) -> tuple[int, set[int]]:
+    """
+    Decode a feed position; a bare sequence number is a position with nothing missing.
+
+    :param value: The position sent back by a resuming client.
+    :return: The highest sequence number received and the missing ones.
+    :raises ValueError: If the position is malformed.
+    """
+    seq, _, missing = value.partition(":")
+    return int(seq), {int(number) for number in missing.split(",")} if missing else set()
+
+
+class Listener:
+    """
+    A feed client waiting for the events of one user's orders, or of every order.
+    """
+
+    def __init__(self, user_id: int | None, size: int):
+        """
+        :param user_id: The user whose orders are followed, None for every order.
+        :param size: The number of undelivered events after which the client is dropped.
+        """
+        self.user_id = user_id
+        self.size = size
+        self.events: deque[dict] = deque()
+        self.overflowed = False
+        self._ready = asyncio.Event()
+
+    def push(self, event: dict) -> None:
+        if len(self.events) >= self.size:
+            # The client fell behind; it is told to resume from its last position
+            self.overflowed = True
+        else:
+            self.events.append(event)
+        self._ready.set()
+
+    async def next_events(self, timeout: float) -> list[dict]:
+        """
+        Wait for the next events.
+
+        :param timeout: Seconds to wait before returning an empty list.
+        :return: The events received since the previous call.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+class OrderFeed:
+    """
+    Keeps the latest order events for resuming clients and pushes new ones to listeners.
+    """
+
+    def __init__(self, buffer_size: int):
+        """
+        :param buffer_size: The number of recent events kept for resuming clients.
+        """
+        self.recent: deque[dict] = deque(maxlen=buffer_size)
+        self.listeners: set[Listener] = set()
+        # Events up to this sequence number may be missing from the buffer
+        self.floor = 0
+        # The highest sequence number received, and the lower ones not received yet
+        # with the time after which they are given up
+        self.seq = 0
+        self.missing: dict[int, float] = {}
+
+    def handle(self, message: str) -> None:
+        """
+        Record an event received from the backplane and push it to its listeners.
+
+        Sequence numbers are drawn before the transaction commits and events arrive
+        from several workers, so an event may arrive after higher-numbered ones. The
+        numbers skipped so far are kept for ORDER_FEED_GAP_WINDOW seconds in the
+        position of each event, so a client resuming from it still gets them.
+
+        :param message: The JSON encoded event.
+        """
+        event = json.loads(message)
+        now = time.monotonic()
+        if event["seq"] > self.seq:
+            # A jump beyond the buffer size is not tracked number by number
+            for seq in range(max(self.seq + 1, event["seq"] - self.recent.maxlen), event["seq"]):
+                self.missing[seq] = now + settings.ORDER_FEED_GAP_WINDOW
+            self.seq = event["seq"]
+        else:
+            self.missing.pop(event["seq"], None)
+        # Numbers still missing after the window belong to rolled back transactions;
+        # they were added in time order, so the expired ones come first
+        for seq, deadline in list(self.missing.items()):
+            if deadline > now:
+                break
+            del self.missing[seq]
+        event["position"] = format_position(self.seq, self.missing)
+        if len(self.recent) == self.recent.maxlen:
+            self.floor = max(self.floor, self.recent[0]["seq"])
+        self.recent.append(event)
+        for listener in self.listeners:
+            if listener.user_id is None or listener.user_id == event["user_id"]:
+                listener.push(event)
+
+    def listen(self, user_id: int | None) -> Listener:
+        listener = Listener(user_id, settings.ORDER_FEED_QUEUE_SIZE)
+        self.listeners.add(listener)
+        return listener
+
+    def unlisten(self, listener: Listener) -> None:
+        self.listeners.discard(listener)
+
+    def replay(self, since: tuple[int, set[int]], user_id: int | None) -> list[dict] | None:
+        """
+        Retrieve the buffered events a resuming client missed: those numbered after
+        its position and those missing from it.
+
+        The events are replayed in the order they arrived, so the position of each
+        one holds for the client once it is delivered.
+
+        :param since: The position of the last event the client received, from `parse_position`.
+        :param user_id: The user whose orders are followed, None for every order.
+        :return: The missed events, or None when some of them are no longer
+            buffered and the client has to refetch its orders.
+        """
+        seq, missing = since
+        if seq < self.floor or any(number <= self.floor for number in missing):
+            return None
+        return [
+            event for event in self.recent
+            if (event["seq"] > seq or event["seq"] in missing)
+            and (user_id is None or event["user_id"] == user_id)
+        ]
+
+
+# The order feed of this worker, fed from the backplane once the application starts
+order_feed = OrderFeed(settings.ORDER_FEED_BUFFER_SIZE)
+
+
+async def start_order_feed() -> None:
+    """
+    Subscribe the order feed to the backplane. Events published before this
+    worker started are not buffered, so clients resuming from before then refetch.
+    """
+    backplane.subscribe(ORDER_EVENTS_CHANNEL, order_feed.handle)
+    async with Connection()._session_factory() as session:
+        order_feed.floor = order_feed.seq = await session.scalar(text(
+            "SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM order_events_seq"
+        ))
+
+
+def stop_order_feed() -> None:
+    backplane.unsubscribe(ORDER_EVENTS_CHANNEL, order_feed.handle)
+
+
+async def follow(user_id: int | None, since: tuple[int, set[int]] | None) -> AsyncIterator[list[dict]]:
+    """
+    Follow the order feed: first the events missed since `since`, then new ones.
+
+    An empty batch is yielded when no event arrived for ORDER_FEED_KEEPALIVE
+    seconds. A reset event ends the feed when the client cannot be caught up
+    from the buffer; it should then refetch its orders and follow again.
+
+    :param user_id: The user whose orders are followed, None for every order.
+    :param since: The position of the last event the client received, if any.
+    :return: An async iterator over batches of events.
+    """
+    # Listen before replaying, so no event falls between the replay and the live feed
+    listener = order_feed.listen(user_id)
+    try:
+        replayed = set()
+        if since is not None:
+            missed = order_feed.replay(since, user_id)
+            if missed is None:
+                yield [RESET]
+                return
+            replayed = {event["seq"] for event in missed}
+            if missed:
+                yield missed
+        while True:
+            events = await listener.next_events(settings.ORDER_FEED_KEEPALIVE)
+            if listener.overflowed:
+                yield [RESET]
+                return
+            yield [event for event in events if event["seq"] not in replayed]
+    finally:
+        order_feed.unlisten(listener)
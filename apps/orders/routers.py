@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from typing import Literal
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, status
+from fastapi.responses import StreamingResponse
+from apps.orders.feed import RESET, follow, parse_position
 from apps.orders.services import get_order_service, OrderService
 from apps.orders.schemas import OrderCreate, OrderRead, OrderUpdate, OrderPatch
+from core.dependencies import Principal, UserHandling
+from core.pagination import Page
+from core.streaming import export_response
+from core.timestamps import Timestamp
 
-router = APIRouter(prefix="/orders", tags=["orders"])
+router = APIRouter()
 
 @router.post("/", response_model=OrderRead)
 async def create_order(order: OrderCreate, service: OrderService = Depends(get_order_service)):
@@ -15,17 +25,147 @@ async def create_order(order: OrderCreate, service: OrderService = Depends(get_o
     """
     return await service.create_order(order)
 
-@router.get("/", response_model=list[OrderRead])
-async def get_orders(page: int = 1, size: int = 10, service: OrderService = Depends(get_order_service)):
+@router.get("/", response_model=Page[OrderRead])
+async def get_orders(
+        cursor: str | None = Query(default=None),
+        size: int = Query(default=10, ge=1, le=100),
+        user_id: int | None = Query(default=None),
+        created_from: Timestamp | None = Query(default=None, alias="from"),
+        created_to: Timestamp | None = Query(default=None, alias="to"),
+        service: OrderService = Depends(get_order_service),
+        user: Principal = Depends(UserHandling().principal),
+):
     """
-    Retrieve a list of orders with pagination.
+    Retrieve a page of orders, newest first; admins only. Users list their own
+    orders with `GET /users/me/orders`.
 
-    :param page: The page number to retrieve.
+    :param cursor: The `next_cursor` of the previous page, omitted for the first page.
     :param size: The number of orders per page.
+    :param user_id: Only retrieve the orders of this user.
+    :param created_from: Only retrieve orders created at or after this time.
+    :param created_to: Only retrieve orders created before this time.
     :param service: The order service dependency.
-    :return: A list of orders.
+    :param user: The authenticated user.
+    :return: A page of orders and the cursor of the next page.
     """
-    return await service.get_orders(page, size)
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can list every order")
+    return await service.get_orders(cursor, size, user_id, created_from, created_to)
+
+@router.get("/export")
+async def export_orders(
+        created_from: Timestamp | None = Query(default=None),
+        created_to: Timestamp | None = Query(default=None),
+        user_id: int | None = Query(default=None),
+        format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+        service: OrderService = Depends(get_order_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Stream every matching order as NDJSON or CSV; admins only.
+
+    :param created_from: Only export orders created at or after this time.
+    :param created_to: Only export orders created before this time.
+    :param user_id: Only export the orders of this user.
+    :param format: The export format.
+    :param service: The order service dependency.
+    :param user: The authenticated user.
+    :return: A streaming response with one order per line.
+    """
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can export orders")
+    return export_response(service.export_orders(created_from, created_to, user_id), OrderRead, format, "orders")
+
+def feed_scope(principal: Principal, all_orders: bool) -> int | None:
+    # Users follow their own orders; admins may follow every order, as a store's queue
+    if not all_orders:
+        return principal.id
+    if principal.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can follow every order")
+    return None
+
+def resume_position(since: str | None) -> tuple[int, set[int]] | None:
+    # Decode the feed position a client resumes from, if it sent one
+    if since is None:
+        return None
+    try:
+        return parse_position(since)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid feed position")
+
+async def sse_events(user_id: int | None, since: tuple[int, set[int]] | None) -> AsyncIterator[str]:
+    async for events in follow(user_id, since):
+        if not events:
+            yield ": keepalive\n\n"
+        for event in events:
+            if event is RESET:
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                yield f"id: {event['position']}\nevent: order\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/events")
+async def order_events(
+        token: str = Query(),
+        since: str | None = Query(default=None),
+        all_orders: bool = Query(default=False),
+        last_event_id: str | None = Header(default=None),
+):
+    """
+    Stream order change events as Server-Sent Events instead of polling.
+
+    :param token: An access token, passed in the query string since EventSource cannot send headers.
+    :param since: Resume after this feed position, the ID of the last event received.
+    :param all_orders: Follow every order instead of the user's own; admins only.
+    :param last_event_id: Sent by reconnecting EventSource clients; takes precedence over `since`.
+    :return: A text/event-stream response.
+    """
+    principal = await UserHandling.principal_from_token(token)
+    user_id = feed_scope(principal, all_orders)
+    position = resume_position(last_event_id if last_event_id is not None else since)
+    return StreamingResponse(
+        sse_events(user_id, position),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws")
+async def order_events_ws(
+        websocket: WebSocket,
+        token: str = Query(),
+        since: str | None = Query(default=None),
+        all_orders: bool = Query(default=False),
+):
+    """
+    Push order change events over a WebSocket, one JSON array of events per message.
+
+    :param websocket: The WebSocket connection.
+    :param token: An access token, passed in the query string since browsers cannot send headers.
+    :param since: Resume after this feed position, the `position` of the last event received.
+    :param all_orders: Follow every order instead of the user's own; admins only.
+    """
+    try:
+        user_id = feed_scope(await UserHandling.principal_from_token(token), all_orders)
+        position = resume_position(since)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    async def send_events():
+        async for events in follow(user_id, position):
+            if events:
+                await websocket.send_text(json.dumps(events))
+            if events and events[-1] is RESET:
+                await websocket.close()
+
+    # The client only listens, so its next message is its disconnection
+    sender = asyncio.create_task(send_events())
+    receiver = asyncio.create_task(websocket.receive())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    # Retrieve the outcome of every task, so their exceptions are not reported as unhandled
+    await asyncio.gather(*done, *pending, return_exceptions=True)
 
 @router.get("/{order_id}", response_model=OrderRead)
 async def get_order_by_id(order_id: int, service: OrderService = Depends(get_order_service)):
@@ -36,7 +176,10 @@ async def get_order_by_id(order_id: int, service: OrderService = Depends(get_ord
     :param service: The order service dependency.
     :return: The order if found, otherwise raises a 404 error.
     """
-    return await service.get_order_by_id(order_id)
+    result = await service.get_order_by_id(order_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return result
 
 @router.put("/{order_id}", response_model=OrderRead)
 async def update_order(order_id: int, order: OrderUpdate, service: OrderService = Depends(get_order_service)):
@@ -48,7 +191,10 @@ async def update_order(order_id: int, order: OrderUpdate, service: OrderService
     :param service: The order service dependency.
     :return: The updated order if found, otherwise raises a 404 error.
     """
-    return await service.update_order(order_id, order)
+    result = await service.update_order(order_id, order)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return result
 
 @router.patch("/{order_id}", response_model=OrderRead)
 async def patch_order(order_id: int, order: OrderPatch, service: OrderService = Depends(get_order_service)):
@@ -60,4 +206,7 @@ async def patch_order(order_id: int, order: OrderPatch, service: OrderService =
     :param service: The order service dependency.
     :return: The updated order if found, otherwise raises a 404 error.
     """
-    return await service.patch_order(order_id, order)
\ No newline at end of file
+    result = await service.patch_order(order_id, order)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return result
\ No newline at end of file
@@ -1,12 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from apps.products.schemas import ProductRead
+from core.updates import not_null
 
 class OrderCreate(BaseModel):
     user_id: int
     product_ids: list[int]
 
 class OrderRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     user_id: int
     products: list[ProductRead]
@@ -16,8 +19,10 @@ class OrderUpdate(BaseModel):
     product_ids: list[int]
 
 class OrderPatch(BaseModel):
-    user_id: int
-    product_ids: list[int]
+    user_id: int | None = None
+    product_ids: list[int] | None = None
+
+    _not_null = not_null("user_id", "product_ids")
 
 class OrderProductCreate(BaseModel):
     order_id: int
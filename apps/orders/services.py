@@ -1,9 +1,69 @@
-from fastapi import Depends
-from sqlalchemy import select
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import Integer, Row, any_, delete, event, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from core.connections import get_session
-from core.models import Order, OrderProduct
+from core.pubsub import backplane
+from core.replicas import read_only
+from core.models import Order, OrderProduct, Product, order_events_seq
+from core.pagination import Page, build_page, keyset
+from core.streaming import EXPORT_BATCH_SIZE, stream_scalars
+from core.updates import update_by_id, violated_constraint
+from apps.orders.feed import ORDER_EVENTS_CHANNEL
 from apps.orders.schemas import OrderCreate, OrderRead, OrderUpdate, OrderPatch
+from apps.products.schemas import ProductRead
+from apps.products.services import ProductService
+
+# Loads the line items of every selected order, together with their products,
+# in a single extra SELECT ... WHERE order_id IN (...) JOIN products query.
+with_products = selectinload(Order.order_products).joinedload(OrderProduct.product)
+
+
+# Each order with the product IDs of its line items in insertion order, whose
+# products are then fetched through the request's product loader. The line items
+# are read by a correlated subquery, so only the orders of the page are visited.
+order_rows = select(
+    Order.id,
+    Order.user_id,
+    Order.created_at,
+    func.array(
+        select(OrderProduct.product_id).where(OrderProduct.order_id == Order.id).order_by(OrderProduct.id)
+        .scalar_subquery()
+    ).label("product_ids"),
+)
+
+
+def to_order_read(order: Order) -> OrderRead:
+    """
+    Build the read schema of an order loaded with `with_products`.
+
+    :param order: The order with its line items loaded.
+    :return: The order read schema.
+    """
+    return OrderRead(
+        id=order.id,
+        user_id=order.user_id,
+        products=[ProductRead.model_validate(item.product) for item in order.order_products],
+    )
+
+def row_to_order_read(row: Row, products: dict[int, ProductRead | None]) -> OrderRead:
+    """
+    Build the read schema of an order selected with `order_rows`.
+
+    :param row: The order row with the product IDs of its line items.
+    :param products: The loaded products by ID.
+    :return: The order read schema.
+    """
+    return OrderRead(
+        id=row.id,
+        user_id=row.user_id,
+        products=[products[product_id] for product_id in row.product_ids if products[product_id] is not None],
+    )
 
 class OrderService:
     """
@@ -20,32 +80,145 @@ class OrderService:
 
     async def create_order(self, order: OrderCreate) -> OrderRead:
         """
-        Create a new order.
+        Create a new order together with its line items.
+
+        The products are validated with one query, the order row is inserted with
+        RETURNING and the line items are written with a single executemany, all in
+        one transaction.
 
         :param order: The order data to create.
         :return: The created order.
         """
-        async with self.session:
-            new_order = Order(**order.model_dump())
-            self.session.add(new_order)
-            await self.session.commit()
-            await self.session.refresh(new_order)
-        return OrderRead.model_validate(new_order)
+        products = await self._get_products(order.product_ids)
+        try:
+            result = await self.session.execute(
+                insert(Order).values(user_id=order.user_id).returning(Order.id, order_events_seq.next_value())
+            )
+        except IntegrityError as e:
+            if violated_constraint(e) != "orders_user_id_fkey":
+                raise
+            # The request's unit of work rolls the transaction back
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not found")
+        order_id, seq = result.one()
+        await self._insert_items(order_id, order.product_ids)
+        self._publish("created", order_id, order.user_id, seq)
+        return OrderRead(
+            id=order_id,
+            user_id=order.user_id,
+            products=[products[product_id] for product_id in order.product_ids],
+        )
     
-    async def get_orders(self, page: int, size: int) -> list[OrderRead]:
+    async def _get_products(self, product_ids: list[int]) -> dict[int, ProductRead]:
+        """
+        Load the products of an order with one query, failing if any is missing.
+
+        This validates a write, so it reads the primary within the write transaction
+        rather than going through the product loader, which may read a replica.
+
+        :param product_ids: The product IDs of the order, possibly repeated.
+        :return: The products by ID.
+        """
+        unique_ids = list(set(product_ids))
+        result = await self.session.execute(
+            select(Product).where(Product.id == any_(literal(unique_ids, ARRAY(Integer))))
+        )
+        products = {product.id: ProductRead.model_validate(product) for product in result.scalars()}
+        missing = sorted(set(unique_ids) - products.keys())
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Products not found: {missing}"
+            )
+        return products
+
+    def _publish(self, event_type: str, order_id: int, user_id: int, seq: int) -> None:
         """
-        Retrieve a list of orders with pagination.
+        Publish an order change event to the order feed once the transaction commits.
 
-        :param page: The page number to retrieve.
+        The sequence number is drawn in the RETURNING clause of the change itself,
+        so numbering an event costs no extra round trip.
+
+        :param event_type: Either "created", "updated" or "deleted".
+        :param order_id: The ID of the changed order.
+        :param user_id: The ID of the order's user.
+        :param seq: The event's sequence number.
+        """
+        message = json.dumps({"seq": seq, "type": event_type, "order_id": order_id, "user_id": user_id})
+        event.listen(
+            self.session.sync_session,
+            "after_commit",
+            lambda session: backplane.publish(ORDER_EVENTS_CHANNEL, message),
+            once=True,
+        )
+
+    async def _insert_items(self, order_id: int, product_ids: list[int]) -> None:
+        # Write all the line items of an order with a single executemany
+        if product_ids:
+            await self.session.execute(
+                insert(OrderProduct),
+                [{"order_id": order_id, "product_id": product_id} for product_id in product_ids]
+            )
+
+    @read_only
+    async def get_orders(
+            self,
+            cursor: str | None,
+            size: int,
+            user_id: int | None = None,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None
+    ) -> Page[OrderRead]:
+        """
+        Retrieve a page of orders, newest first, using keyset pagination on
+        (created_at, id). Filtered by user, the page is read from the
+        (user_id, created_at, id) index.
+
+        :param cursor: The cursor returned with the previous page, if any.
         :param size: The number of orders per page.
-        :return: A list of orders.
+        :param user_id: Only retrieve the orders of this user, if given.
+        :param created_from: The inclusive lower bound of `created_at`, if any.
+        :param created_to: The exclusive upper bound of `created_at`, if any.
+        :return: A page of orders.
         """
-        async with self.session:
-            query = select(Order).offset((page - 1) * size).limit(size)
-            result = await self.session.execute(query)
-            orders = result.scalars().all()
-            return [OrderRead.model_validate(order) for order in orders]
+        query = order_rows
+        if user_id is not None:
+            query = query.where(Order.user_id == user_id)
+        if created_from is not None:
+            query = query.where(Order.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(Order.created_at < created_to)
+        result = await self.session.execute(
+            keyset(query, [Order.created_at, Order.id], cursor, size, descending=True)
+        )
+        rows = result.all()
+        products = await self._load_products(rows)
+        return build_page(rows, size, ["created_at", "id"], lambda row: row_to_order_read(row, products))
         
+    async def export_orders(
+            self,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None,
+            user_id: int | None = None
+    ) -> AsyncIterator[OrderRead]:
+        """
+        Stream every matching order with its products through a server-side cursor.
+
+        :param created_from: The inclusive lower bound of `created_at`, if any.
+        :param created_to: The exclusive upper bound of `created_at`, if any.
+        :param user_id: Only export the orders of this user, if given.
+        :return: An async iterator over the orders.
+        """
+        query = select(Order).options(with_products).order_by(Order.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        if created_from is not None:
+            query = query.where(Order.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(Order.created_at < created_to)
+        if user_id is not None:
+            query = query.where(Order.user_id == user_id)
+        async for order in stream_scalars(self.session, query):
+            yield to_order_read(order)
+
+    @read_only
     async def get_order_by_id(self, order_id: int) -> OrderRead | None:
         """
         Retrieve an order by its ID.
@@ -53,60 +226,94 @@ class OrderService:
         :param order_id: The ID of the order to retrieve.
         :return: The order if found, otherwise None.
         """
-        async with self.session:
-            query = select(Order).where(Order.id == order_id)
-            result = await self.session.execute(query)
-            order = result.scalar_one_or_none()
-            return OrderRead.model_validate(order) if order else None
+        result = await self.session.execute(order_rows.where(Order.id == order_id))
+        row = result.one_or_none()
+        if row is None:
+            return None
+        return row_to_order_read(row, await self._load_products([row]))
+
+    async def _load_products(self, rows: list[Row]) -> dict[int, ProductRead | None]:
+        """
+        Load the products of orders selected with `order_rows` in one batch.
+
+        Each product is fetched once however many orders list it, and not at all
+        if the request already loaded it.
+
+        :param rows: The order rows.
+        :return: The products by ID, None for the ones deleted since.
+        """
+        return await ProductService(self.session).loader.load_many(
+            product_id for row in rows for product_id in row.product_ids
+        )
 
     async def update_order(self, order_id: int, order: OrderUpdate) -> OrderRead | None:
         """
-        Update an order by its ID.
+        Update an order and replace its line items by its ID.
 
         :param order_id: The ID of the order to update.
         :param order: The updated order data.
         :return: The updated order if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Order).where(Order.id == order_id))
-            order = result.scalar_one_or_none()
-            if order:
-                order.user_id = order.user_id
-                await self.session.commit()
-                await self.session.refresh(order)
-                return OrderRead.model_validate(order)
-            return None
-        
+        return await self._update(order_id, order.model_dump(exclude_none=True))
+
     async def patch_order(self, order_id: int, order: OrderPatch) -> OrderRead | None:
         """
-        Partially update an order by its ID.
+        Partially update an order by its ID. Line items are replaced only when
+        `product_ids` is sent.
 
         :param order_id: The ID of the order to patch.
-        :param order: The partial order data to update.
+        :param order: The partial order data.
         :return: The updated order if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Order).where(Order.id == order_id))
-            order = result.scalar_one_or_none()
-            if order:
-                order.user_id = order.user_id
-                await self.session.commit()
-                await self.session.refresh(order)
-                return OrderRead.model_validate(order)
+        return await self._update(order_id, order.model_dump(exclude_unset=True))
+
+    async def _update(self, order_id: int, values: dict) -> OrderRead | None:
+        """
+        Update an order with a single UPDATE ... RETURNING and, when product IDs
+        are given, replace its line items.
+
+        :param order_id: The ID of the order to update.
+        :param values: The column values to set, plus the optional `product_ids`.
+        :return: The updated order if found, otherwise None.
+        """
+        product_ids = values.pop("product_ids", None)
+        products = await self._get_products(product_ids) if product_ids is not None else None
+        try:
+            result = await self.session.execute(
+                update_by_id(Order, order_id, values).returning(Order.user_id, order_events_seq.next_value())
+            )
+        except IntegrityError as e:
+            if violated_constraint(e) != "orders_user_id_fkey":
+                raise
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not found")
+        row = result.one_or_none()
+        if row is None:
             return None
-        
+        user_id, seq = row
+        self._publish("updated", order_id, user_id, seq)
+        if products is None:
+            return await self.get_order_by_id(order_id)
+        await self.session.execute(delete(OrderProduct).where(OrderProduct.order_id == order_id))
+        await self._insert_items(order_id, product_ids)
+        return OrderRead(
+            id=order_id,
+            user_id=user_id,
+            products=[products[product_id] for product_id in product_ids],
+        )
+
     async def delete_order(self, order_id: int) -> None:
         """
         Delete an order by its ID.
 
         :param order_id: The ID of the order to delete.
         """
-        async with self.session:
-            result = await self.session.execute(select(Order).where(Order.id == order_id))
-            order = result.scalar_one_or_none()
-            if order:
-                await self.session.delete(order)
-                await self.session.commit()
+        await self.session.execute(delete(OrderProduct).where(OrderProduct.order_id == order_id))
+        result = await self.session.execute(
+            delete(Order).where(Order.id == order_id).returning(Order.user_id, order_events_seq.next_value())
+        )
+        row = result.one_or_none()
+        if row is not None:
+            self._publish("deleted", order_id, *row)
 
 def get_order_service(session: AsyncSession = Depends(get_session)):
     """
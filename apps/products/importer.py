@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import csv
+import json
+from collections.abc import AsyncIterator
+
+from apps.products.services import ProductService
+from core.connections import Connection
+
+# Size of the chunks read from an import file by the command line entry point
+READ_SIZE = 64 * 1024
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a stream of byte chunks into decoded text lines.
+
+    :param chunks: The byte chunks of the uploaded file.
+    :return: An async iterator over the lines, without line terminators.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8-sig")
+    if buffer:
+        yield buffer.rstrip(b"\r").decode("utf-8-sig")
+
+
+async def iter_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """
+    Parse a CSV (with a header row) or NDJSON stream into raw product rows.
+
+    Rows are parsed one line at a time, so quoted CSV values cannot span lines.
+    Blank lines are skipped and do not count as rows.
+
+    :param chunks: The byte chunks of the uploaded file.
+    :param fmt: Either "csv" or "ndjson".
+    :return: An async iterator of (row number, row, parse error) tuples.
+    """
+    header = None
+    number = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            number += 1
+            if len(values) != len(header):
+                yield number, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            # Empty cells are treated as missing values
+            yield number, {key: value for key, value in zip(header, values) if value != ""}, None
+        else:
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "Expected a JSON object"
+                continue
+            yield number, row, None
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    """
+    Read a local file in chunks.
+
+    :param path: The path of the file.
+    :return: An async iterator over the chunks of the file.
+    """
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_SIZE):
+            yield chunk
+
+
+async def run(path: str, fmt: str, upsert: bool) -> None:
+    """
+    Import a file through a session of its own and print the report.
+
+    :param path: The path of the file.
+    :param fmt: Either "csv" or "ndjson".
+    :param upsert: Whether to update existing products instead of duplicating them.
+    """
+    connection = Connection()
+    try:
+        async with connection._session_factory() as session:
+            async with session.begin():
+                report = await ProductService(session).bulk_import(iter_rows(read_file(path), fmt), upsert)
+        print(report.model_dump_json(indent=2))
+    finally:
+        await connection.close()
+
+
+def main() -> None:
+    """
+    Command line entry point: python -m apps.products.importer menu.csv [--upsert]
+    """
+    parser = argparse.ArgumentParser(description="Bulk import products from a CSV or NDJSON file.")
+    parser.add_argument("path", help="The CSV (with a header row) or NDJSON file to import")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="The file format, guessed from the extension by default")
+    parser.add_argument("--upsert", action="store_true", help="Update existing products with the same name and category")
+    args = parser.parse_args()
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    asyncio.run(run(args.path, fmt, args.upsert))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, Query, status
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from apps.products.importer import iter_rows
 from apps.products.services import get_product_service, ProductService
-from apps.products.schemas import ProductCreate, ProductRead, ProductUpdate, ProductPatch
-from core.dependencies import UserHandling
-from core.models import User
+from apps.products.schemas import ProductCreate, ProductImportReport, ProductRead, ProductUpdate, ProductPatch
+from core.dependencies import Principal, UserHandling
+from core.etag import table_etag
+from core.multiget import MultiGet, build_multiget, parse_ids
+from core.pagination import Page
+from core.streaming import export_response
+from core.timestamps import Timestamp
 
 router = APIRouter()
 
@@ -10,7 +16,7 @@ router = APIRouter()
 async def create_product(
         product: ProductCreate,
         service: ProductService = Depends(get_product_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Create a new product.
@@ -22,29 +28,95 @@ async def create_product(
     """
     return await service.create_product(product)
 
-@router.get("/", response_model=list[ProductRead])
+@router.post("/bulk", response_model=ProductImportReport)
+async def bulk_import_products(
+        request: Request,
+        upsert: bool = Query(default=False),
+        format: Literal["csv", "ndjson"] | None = Query(default=None),
+        service: ProductService = Depends(get_product_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Import products from a streamed CSV (with a header row) or NDJSON body.
+
+    :param request: The request whose body is streamed.
+    :param upsert: Whether to update existing products with the same name and category.
+    :param format: The body format, taken from the Content-Type header when omitted.
+    :param service: The product service dependency.
+    :param user: The authenticated user.
+    :return: The number of inserted and updated products and the per-row errors.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    return await service.bulk_import(iter_rows(request.stream(), format), upsert)
+
+@router.get("/", response_model=Page[ProductRead])
 async def get_products(
-        page: int = Query(default=1, ge=1),
+        cursor: str | None = Query(default=None),
         size: int = Query(default=10, ge=1, le=100),
         service: ProductService = Depends(get_product_service),
-        user: User = Depends(UserHandling().user),
+        user: Principal = Depends(UserHandling().principal),
+        etag: None = Depends(table_etag("products")),
 ):
     """
-    Retrieve a list of products with pagination.
+    Retrieve a page of products.
 
-    :param page: The page number to retrieve.
+    :param cursor: The `next_cursor` of the previous page, omitted for the first page.
     :param size: The number of products per page.
     :param service: The product service dependency.
     :param user: The authenticated user.
-    :return: A list of products.
+    :param etag: Answers 304 when the client's copy is current.
+    :return: A page of products and the cursor of the next page.
+    """
+    return await service.get_products(cursor, size)
+
+@router.get("/export")
+async def export_products(
+        created_from: Timestamp | None = Query(default=None),
+        created_to: Timestamp | None = Query(default=None),
+        format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+        service: ProductService = Depends(get_product_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Stream every product as NDJSON or CSV; admins only.
+
+    :param created_from: Only export products created at or after this time.
+    :param created_to: Only export products created before this time.
+    :param format: The export format.
+    :param service: The product service dependency.
+    :param user: The authenticated user.
+    :return: A streaming response with one product per line.
+    """
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can export products")
+    return export_response(service.export_products(created_from, created_to), ProductRead, format, "products")
+
+@router.get("/batch", response_model=MultiGet[ProductRead])
+async def get_products_batch(
+        ids: list[int] = Depends(parse_ids),
+        service: ProductService = Depends(get_product_service),
+        user: Principal = Depends(UserHandling().principal),
+        etag: None = Depends(table_etag("products")),
+):
+    """
+    Retrieve several products by ID with a single query.
+
+    :param ids: The comma-separated IDs of the products, at most MULTI_GET_MAX_IDS.
+    :param service: The product service dependency.
+    :param user: The authenticated user.
+    :param etag: Answers 304 when the client's copy is current.
+    :return: The products in request order, null for each ID not found, and the missing IDs.
     """
-    return await service.get_products(page, size)
+    found = await service.loader.load_many(ids)
+    return build_multiget(ids, found, ProductRead.model_validate)
 
 @router.get("/{product_id}", response_model=ProductRead)
 async def get_product_by_id(
         product_id: int,
         service: ProductService = Depends(get_product_service),
-        user: User = Depends(UserHandling().user),
+        user: Principal = Depends(UserHandling().principal),
+        etag: None = Depends(table_etag("products")),
 ):
     """
     Retrieve a product by its ID.
@@ -52,16 +124,20 @@ async def get_product_by_id(
     :param product_id: The ID of the product to retrieve.
     :param service: The product service dependency.
     :param user: The authenticated user.
+    :param etag: Answers 304 when the client's copy is current.
     :return: The product if found, otherwise raises a 404 error.
     """
-    return await service.get_product_by_id(product_id)
+    result = await service.get_product_by_id(product_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return result
 
 @router.put("/{product_id}", response_model=ProductRead)
 async def update_product(
         product_id: int,
         product: ProductUpdate,
         service: ProductService = Depends(get_product_service),
-        user: User = Depends(UserHandling().user),
+        user: Principal = Depends(UserHandling().principal),
 ):
     """
     Update a product by its ID.
@@ -72,14 +148,17 @@ async def update_product(
     :param user: The authenticated user.
     :return: The updated product if found, otherwise raises a 404 error.
     """
-    return await service.update_product(product_id, product)
+    result = await service.update_product(product_id, product)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return result
 
 @router.patch("/{product_id}", response_model=ProductRead)
 async def patch_product(
         product_id: int,
         product: ProductPatch,
         service: ProductService = Depends(get_product_service),
-        user: User = Depends(UserHandling().user),
+        user: Principal = Depends(UserHandling().principal),
 ):
     """
     Partially update a product by its ID.
@@ -90,13 +169,16 @@ async def patch_product(
     :param user: The authenticated user.
     :return: The updated product if found, otherwise raises a 404 error.
     """
-    return await service.patch_product(product_id, product)
+    result = await service.patch_product(product_id, product)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return result
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
         product_id: int,
         service: ProductService = Depends(get_product_service),
-        user: User = Depends(UserHandling().user),
+        user: Principal = Depends(UserHandling().principal),
 ):
     """
     Delete a product by its ID.
@@ -1,20 +1,38 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
+from core.updates import not_null
 
 class ProductBase(BaseModel):
     name: str
     description: Optional[str] = Field(None, description="The description of the product")
+    price: float = Field(..., description="The price of the product")
 
 class ProductCreate(ProductBase):
     category_id: int
 
 class ProductRead(ProductBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     category_id: int
 
 class ProductUpdate(ProductBase):
     category_id: Optional[int] = Field(None, description="The id of the category of the product")
 
-class ProductPatch(ProductBase):
+class ProductPatch(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = Field(None, description="The description of the product")
+    price: Optional[float] = Field(None, description="The price of the product")
     category_id: Optional[int] = Field(None, description="The id of the category of the product")
 
+    _not_null = not_null("name", "price", "category_id")
+
+class ProductImportError(BaseModel):
+    row: int = Field(..., description="The 1-based number of the data row in the uploaded file")
+    error: str
+
+class ProductImportReport(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: list[ProductImportError] = []
@@ -1,9 +1,27 @@
-from fastapi import Depends
-from sqlalchemy import select
+from collections.abc import AsyncIterator
+from datetime import datetime
+from asyncpg import PostgresError
+from fastapi import Depends, HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import Integer, any_, delete, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.connections import get_session
-from core.models import Product
-from apps.products.schemas import ProductCreate, ProductRead, ProductUpdate, ProductPatch
+from core.loader import BatchLoader, batch_loader
+from core.replicas import read_only
+from core.singleflight import singleflight
+from core.models import Category, Product
+from core.pagination import Page, build_page, keyset
+from core.streaming import EXPORT_BATCH_SIZE, stream_scalars
+from core.updates import update_by_id, violated_constraint
+from apps.products.schemas import (
+    ProductCreate, ProductRead, ProductUpdate, ProductPatch, ProductImportError, ProductImportReport
+)
+
+# Number of validated rows written per COPY
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_COLUMNS = ["name", "description", "price", "category_id", "created_at", "updated_at", "is_active"]
 
 
 class ProductService:
@@ -26,92 +44,222 @@ class ProductService:
         :param product: The product data to create.
         :return: The created product.
         """
-        async with self.session:
-            new_product = Product(**product.model_dump())
-            self.session.add(new_product)
-            await self.session.commit()
-            await self.session.refresh(new_product)
+        new_product = await self.session.scalar(insert(Product).values(**product.model_dump()).returning(Product))
         return ProductRead.model_validate(new_product)
-    
-    async def get_products(self, page: int, size: int) -> list[ProductRead]:
+
+    async def bulk_import(
+            self,
+            rows: AsyncIterator[tuple[int, dict | None, str | None]],
+            upsert: bool = False
+    ) -> ProductImportReport:
+        """
+        Import products in chunks with COPY.
+
+        Rows are validated with `ProductCreate` as they arrive. Invalid rows, and
+        rows whose category does not exist, are reported and skipped without
+        aborting the import. Each chunk is written in a savepoint of its own, so a
+        chunk that fails in the database is reported and rolled back alone.
+
+        :param rows: The parsed rows as (row number, row, parse error) tuples.
+        :param upsert: Whether to update the existing products with the same name
+            and category instead of inserting duplicates.
+        :return: The import report.
+        """
+        report = ProductImportReport()
+        chunk = []
+        async for number, row, error in rows:
+            if error is None:
+                try:
+                    chunk.append((number, ProductCreate.model_validate(row)))
+                except ValidationError as e:
+                    error = "; ".join(
+                        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in e.errors()
+                    )
+            if error is not None:
+                report.errors.append(ProductImportError(row=number, error=error))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await self._import_chunk(chunk, upsert, report)
+                chunk = []
+        if chunk:
+            await self._import_chunk(chunk, upsert, report)
+        report.errors.sort(key=lambda item: item.row)
+        report.failed = len(report.errors)
+        return report
+
+    async def _import_chunk(self, chunk: list[tuple[int, ProductCreate]], upsert: bool, report: ProductImportReport) -> None:
+        """
+        Write one chunk of validated rows and record the outcome in the report.
+
+        :param chunk: The (row number, product) pairs to write.
+        :param upsert: Whether to update existing products with the same name and category.
+        :param report: The import report to update.
+        """
+        category_ids = list({product.category_id for _, product in chunk})
+        try:
+            async with self.session.begin_nested():
+                result = await self.session.execute(
+                    select(Category.id).where(Category.id == any_(literal(category_ids, ARRAY(Integer))))
+                )
+                existing = set(result.scalars())
+                valid = [(number, product) for number, product in chunk if product.category_id in existing]
+                if upsert:
+                    # Later rows win over earlier rows with the same name and category
+                    valid = list({(product.name, product.category_id): (number, product) for number, product in valid}.values())
+                now = datetime.now()
+                records = [
+                    (product.name, product.description, product.price, product.category_id, now, now, True)
+                    for _, product in valid
+                ]
+                inserted, updated = 0, 0
+                if records:
+                    # The COPY runs on the connection of the current transaction and savepoint
+                    connection = await self.session.connection()
+                    raw = (await connection.get_raw_connection()).driver_connection
+                    if upsert:
+                        inserted, updated = await self._upsert_records(raw, records)
+                    else:
+                        await raw.copy_records_to_table("products", records=records, columns=IMPORT_COLUMNS)
+                        inserted = len(records)
+        except (SQLAlchemyError, PostgresError) as e:
+            report.errors.extend(ProductImportError(row=number, error=str(e)) for number, _ in chunk)
+            return
+        report.errors.extend(
+            ProductImportError(row=number, error="category_id: Category not found")
+            for number, product in chunk if product.category_id not in existing
+        )
+        report.inserted += inserted
+        report.updated += updated
+
+    async def _upsert_records(self, raw, records: list[tuple]) -> tuple[int, int]:
+        """
+        Upsert records on name and category through a temporary staging table.
+
+        :param raw: The asyncpg connection of the current transaction.
+        :param records: The records to upsert, in `IMPORT_COLUMNS` order.
+        :return: The number of inserted and updated products.
+        """
+        await self.session.execute(text(
+            f"CREATE TEMPORARY TABLE product_import AS "
+            f"SELECT {', '.join(IMPORT_COLUMNS)} FROM products WITH NO DATA"
+        ))
+        await raw.copy_records_to_table("product_import", records=records, columns=IMPORT_COLUMNS)
+        updated = await self.session.execute(text(
+            "UPDATE products AS p "
+            "SET description = i.description, price = i.price, updated_at = i.updated_at "
+            "FROM product_import AS i "
+            "WHERE p.name = i.name AND p.category_id = i.category_id"
+        ))
+        inserted = await self.session.execute(text(
+            f"INSERT INTO products ({', '.join(IMPORT_COLUMNS)}) "
+            f"SELECT {', '.join('i.' + column for column in IMPORT_COLUMNS)} FROM product_import AS i "
+            "WHERE NOT EXISTS ("
+            "SELECT 1 FROM products AS p WHERE p.name = i.name AND p.category_id = i.category_id)"
+        ))
+        await self.session.execute(text("DROP TABLE product_import"))
+        return inserted.rowcount, updated.rowcount
+
+    @read_only
+    async def get_products(self, cursor: str | None, size: int) -> Page[ProductRead]:
         """
-        Retrieve a list of products with pagination.
+        Retrieve a page of products using keyset pagination.
 
-        :param page: The page number to retrieve.
+        :param cursor: The cursor returned with the previous page, if any.
         :param size: The number of products per page.
-        :return: A list of products.
+        :return: A page of products.
         """
-        async with self.session:
-            query = select(Product).offset((page - 1) * size).limit(size)
-            result = await self.session.execute(query)
-            products = result.scalars().all()
-            return [ProductRead.model_validate(product) for product in products]
+        query = keyset(select(Product), [Product.id], cursor, size)
+        result = await self.session.execute(query)
+        products = result.scalars().all()
+        return build_page(products, size, ["id"], ProductRead.model_validate)
         
+    async def export_products(
+            self,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None
+    ) -> AsyncIterator[ProductRead]:
+        """
+        Stream every product created in a time range through a server-side cursor.
+
+        :param created_from: The inclusive lower bound of `created_at`, if any.
+        :param created_to: The exclusive upper bound of `created_at`, if any.
+        :return: An async iterator over the products.
+        """
+        query = select(Product).order_by(Product.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        if created_from is not None:
+            query = query.where(Product.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(Product.created_at < created_to)
+        async for product in stream_scalars(self.session, query):
+            yield ProductRead.model_validate(product)
+
+    @property
+    def loader(self) -> BatchLoader:
+        """
+        The request's batch loader of products by ID.
+        """
+        return batch_loader(self.session, "products", self.get_products_by_ids)
+
+    @read_only
+    async def get_products_by_ids(self, product_ids: list[int]) -> dict[int, ProductRead]:
+        """
+        Retrieve several products with a single query.
+
+        :param product_ids: The IDs of the products to retrieve.
+        :return: The found products by ID.
+        """
+        result = await self.session.execute(
+            select(Product).where(Product.id == any_(literal(product_ids, ARRAY(Integer))))
+        )
+        return {product.id: ProductRead.model_validate(product) for product in result.scalars()}
+
+    @read_only
+    @singleflight
     async def get_product_by_id(self, product_id: int) -> ProductRead | None:
         """
-        Retrieve a product by its ID.
+        Retrieve a product by its ID, batched with the other products requested
+        in the same event-loop iteration.
 
         :param product_id: The ID of the product to retrieve.
         :return: The product if found, otherwise None.
         """
-        async with self.session:
-            query = select(Product).where(Product.id == product_id)
-            result = await self.session.execute(query)
-            product = result.scalar_one_or_none()
-            return ProductRead.model_validate(product) if product else None
+        return await self.loader.load(product_id)
         
     async def update_product(self, product_id: int, product: ProductUpdate) -> ProductRead | None:
         """
-        Update a product by its ID.
+        Update a product by its ID with a single UPDATE ... RETURNING.
 
         :param product_id: The ID of the product to update.
-        :param product: The updated product data.
+        :param product: The updated product data; fields left as None are not changed.
         :return: The updated product if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Product).where(Product.id == product_id))
-            product = result.scalar_one_or_none()
-            if product:
-                product.name = product.name
-                product.description = product.description
-                product.category_id = product.category_id
-                await self.session.commit()
-                await self.session.refresh(product)
-                return ProductRead.model_validate(product)
-            return None
-        
+        return await self._update(product_id, product.model_dump(exclude_none=True))
+
     async def patch_product(self, product_id: int, product: ProductPatch) -> ProductRead | None:
         """
-        Partially update a product by its ID.
+        Partially update a product by its ID with a single UPDATE ... RETURNING.
 
         :param product_id: The ID of the product to patch.
-        :param product: The partial product data to update.
+        :param product: The partial product data; only the fields that were sent are changed.
         :return: The updated product if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(Product).where(Product.id == product_id))
-            product = result.scalar_one_or_none()
-            if product:
-                product.name = product.name
-                product.description = product.description
-                product.category_id = product.category_id
-                await self.session.commit()
-                await self.session.refresh(product)
-                return ProductRead.model_validate(product)
-            return None
-        
+        return await self._update(product_id, product.model_dump(exclude_unset=True))
+
+    async def _update(self, product_id: int, values: dict) -> ProductRead | None:
+        try:
+            product = await self.session.scalar(update_by_id(Product, product_id, values).returning(Product))
+        except IntegrityError as e:
+            if violated_constraint(e) != "products_category_id_fkey":
+                raise
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found")
+        return ProductRead.model_validate(product) if product else None
+
     async def delete_product(self, product_id: int) -> None:
         """
         Delete a product by its ID.
 
         :param product_id: The ID of the product to delete.
         """
-        async with self.session:
-            result = await self.session.execute(select(Product).where(Product.id == product_id))
-            product = result.scalar_one_or_none()
-            if product:
-                await self.session.delete(product)
-                await self.session.commit()
+        await self.session.execute(delete(Product).where(Product.id == product_id))
 
 def get_product_service(session: AsyncSession = Depends(get_session)):
     """
@@ -1,14 +1,19 @@
+from typing import Literal
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.params import Query
 from sqlalchemy.orm import Session
-from typing import List
 
+from apps.orders.schemas import OrderRead
+from apps.orders.services import get_order_service, OrderService
 from apps.users.services import get_user_service, UserService
-from apps.users.schemas import UserCreate, UserLogin, UserPatch, UserRead, UserUpdate
-from core.dependencies import UserHandling
+from apps.users.schemas import TokenRefresh, UserCreate, UserLogin, UserPatch, UserRead, UserUpdate
+from core.dependencies import Principal, UserHandling
+from core.multiget import MultiGet, build_multiget, parse_ids
 from core.jwt import JWTHandler
 from core.models import User
-from core.security import verify_password
+from core.pagination import Page
+from core.streaming import export_response
+from core.timestamps import Timestamp
 
 router = APIRouter()
 
@@ -21,25 +26,51 @@ async def create_user(user: UserCreate, service: UserService = Depends(get_user_
     :param service: The user service dependency.
     :return: The created user.
     """
-    db_user = await service.get_user_by_email(user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
     return await service.create_user(user)
 
 @router.post("/authentication")
 async def authenticate_user(user: UserLogin, service: UserService = Depends(get_user_service)):
     """
-    Authenticate a user and return a JWT token.
+    Authenticate a user and return a short-lived access token and a refresh token.
 
     :param user: The login credentials.
     :param service: The user service dependency.
-    :return: A dictionary containing the access token and token type.
+    :return: A dictionary containing the access token, refresh token and token type.
     """
-    db_user = await service.get_user_by_username(user.username)
-    if not db_user or not verify_password(user.password, db_user.password):
+    db_user = await service.authenticate_user(user.username, user.password)
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = await JWTHandler().create_token(db_user)
-    return {"access_token": token, "token_type": "Bearer"}
+    return await JWTHandler().create_token_pair(db_user)
+
+@router.post("/refresh")
+async def refresh_token(data: TokenRefresh, service: UserService = Depends(get_user_service)):
+    """
+    Exchange a refresh token for a new token pair carrying the user's current claims.
+
+    :param data: The refresh token.
+    :param service: The user service dependency.
+    :return: A dictionary containing the access token, refresh token and token type.
+    """
+    payload = await JWTHandler().decode_jwt(data.refresh_token)
+    if not payload or payload.get("typ") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    db_user = await service.get_user_by_id(payload["uid"])
+    if not db_user or not db_user.is_active or db_user.token_version != payload["ver"]:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return await JWTHandler().create_token_pair(db_user)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+        user: Principal = Depends(UserHandling().principal),
+        service: UserService = Depends(get_user_service)
+):
+    """
+    Revoke every access and refresh token of the authenticated user.
+
+    :param user: The authenticated user.
+    :param service: The user service dependency.
+    """
+    await service.revoke_tokens(user.id)
 
 @router.post("/verification")
 async def verification(
@@ -75,30 +106,91 @@ async def get_me(user: User = Depends(UserHandling().user)):
     """
     return user
 
-@router.get("/users", response_model=List[UserRead])
+@router.get("/me/orders", response_model=Page[OrderRead])
+async def get_my_orders(
+        cursor: str | None = Query(None),
+        size: int = Query(10, ge=1, le=100),
+        created_from: Timestamp | None = Query(None, alias="from"),
+        created_to: Timestamp | None = Query(None, alias="to"),
+        service: OrderService = Depends(get_order_service),
+        user: User = Depends(UserHandling().user)
+):
+    """
+    Retrieve a page of the authenticated user's orders, newest first.
+
+    :param cursor: The `next_cursor` of the previous page, omitted for the first page.
+    :param size: The number of orders per page.
+    :param created_from: Only retrieve orders created at or after this time.
+    :param created_to: Only retrieve orders created before this time.
+    :param service: The order service dependency.
+    :param user: The authenticated user.
+    :return: A page of orders and the cursor of the next page.
+    """
+    return await service.get_orders(cursor, size, user.id, created_from, created_to)
+
+@router.get("/users", response_model=Page[UserRead])
 async def read_users(
-        page: int = Query(1, ge=1),
+        cursor: str | None = Query(None),
         size: int = Query(10, ge=1, le=100),
         service: UserService = Depends(get_user_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
-    Retrieve a list of users with pagination.
+    Retrieve a page of users.
 
-    :param page: The page number to retrieve.
+    :param cursor: The `next_cursor` of the previous page, omitted for the first page.
     :param size: The number of users per page.
     :param service: The user service dependency.
     :param user: The authenticated user.
-    :return: A list of users.
+    :return: A page of users and the cursor of the next page.
     """
-    users = await service.get_users(page, size)
+    users = await service.get_users(cursor, size)
     return users
 
+@router.get("/export")
+async def export_users(
+        created_from: Timestamp | None = Query(None),
+        created_to: Timestamp | None = Query(None),
+        format: Literal["ndjson", "csv"] = Query("ndjson"),
+        service: UserService = Depends(get_user_service),
+        user: Principal = Depends(UserHandling().principal)
+):
+    """
+    Stream every user as NDJSON or CSV; admins only.
+
+    :param created_from: Only export users created at or after this time.
+    :param created_to: Only export users created before this time.
+    :param format: The export format.
+    :param service: The user service dependency.
+    :param user: The authenticated user.
+    :return: A streaming response with one user per line.
+    """
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can export users")
+    return export_response(service.export_users(created_from, created_to), UserRead, format, "users")
+
+@router.get("/users/batch", response_model=MultiGet[UserRead])
+async def read_users_batch(
+        ids: list[int] = Depends(parse_ids),
+        service: UserService = Depends(get_user_service),
+        user: Principal = Depends(UserHandling().principal),
+):
+    """
+    Retrieve several users by ID with a single query.
+
+    :param ids: The comma-separated IDs of the users, at most MULTI_GET_MAX_IDS.
+    :param service: The user service dependency.
+    :param user: The authenticated user.
+    :return: The users in request order, null for each ID not found, and the missing IDs.
+    """
+    found = await service.loader.load_many(ids)
+    return build_multiget(ids, found, UserRead.model_validate)
+
 @router.get("/users/{user_id}", response_model=UserRead)
 async def read_user(
         user_id: int,
         service: UserService = Depends(get_user_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Retrieve a user by their ID.
@@ -118,7 +210,7 @@ async def update_user(
         user_id: int,
         data: UserUpdate,
         service: UserService = Depends(get_user_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Update a user by their ID.
@@ -139,7 +231,7 @@ async def patch_user(
         user_id: int,
         data: UserPatch,
         service: UserService = Depends(get_user_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Partially update a user by their ID.
@@ -159,7 +251,7 @@ async def patch_user(
 async def delete_user(
         user_id: int,
         service: UserService = Depends(get_user_service),
-        user: User = Depends(UserHandling().user)
+        user: Principal = Depends(UserHandling().principal)
 ):
     """
     Delete a user by their ID.
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from core.updates import not_null
 
 class UserCreate(BaseModel):
     email: str
@@ -9,7 +10,12 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
 class UserRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     email: str
     username: str
@@ -27,3 +33,5 @@ class UserUpdate(BaseModel):
 class UserPatch(BaseModel):
     email: str | None = None
     username: str | None = None
+
+    _not_null = not_null("email", "username")
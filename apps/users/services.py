@@ -1,10 +1,44 @@
-from sqlalchemy import select
-from fastapi import Depends
-from apps.users.schemas import UserPatch, UserUpdate
-from core.connections import get_session
+from collections.abc import AsyncIterator
+from datetime import datetime
+from sqlalchemy import Integer, any_, delete, event, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from fastapi import Depends, HTTPException
+from apps.users.schemas import UserPatch, UserRead, UserUpdate
+from core.cache import TTLCache
+from core.config import settings
+from core.connections import Connection, get_session
+from core.loader import BatchLoader, batch_loader
+from core.replicas import read_only
 from core.models import User
+from core.pagination import Page, build_page, keyset
+from core.streaming import EXPORT_BATCH_SIZE, stream_scalars
+from core.updates import update_by_id
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.security import get_password_hash, verify_password
+from core.security import hash_password, password_slot, verify_and_update_password
+
+# Column values of users looked up by email or ID, keyed by ("email", email) and ("id", id);
+# only filled from the primary, so an invalidated user is never refilled from a lagging replica
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+USER_COLUMNS = [column.key for column in User.__table__.columns]
+# Current token version of each user, checked against the `ver` claim of access tokens
+token_version_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.TOKEN_VERSION_CACHE_TTL)
+# Changing these revokes the user's tokens, whose claims would otherwise be stale
+TOKEN_CLAIM_COLUMNS = {"role", "is_active"}
+
+
+def cache_user(user: User | None) -> User | None:
+    # Store a snapshot of the user under both of its keys
+    if user is not None:
+        record = {column: getattr(user, column) for column in USER_COLUMNS}
+        user_cache.set(("email", user.email), record)
+        user_cache.set(("id", user.id), record)
+    return user
+
+
+def cached_user(key: tuple) -> User | None:
+    # Each hit gets its own detached User, so requests never share an instance
+    record = user_cache.get(key)
+    return User(**record) if record is not None else None
 
 
 class UserService:
@@ -24,63 +58,138 @@ class UserService:
         """
         Create a new user with a hashed password.
 
+        The password is hashed before the session first touches the database, so no
+        pooled connection is held while bcrypt runs.
+
         :param user: The user data to create.
         :return: The created user.
+        :raises HTTPException: If the email is already registered.
         """
-        hashed_password = get_password_hash(user.password)
-        db_user = User(email=user.email, username=user.username, password=hashed_password)
-        self.session.add(db_user)
-        await self.session.commit()
-        await self.session.refresh(db_user)
-        return db_user
+        async with password_slot():
+            hashed_password = await hash_password(user.password)
+        if await self.get_user_by_email(user.email):
+            raise HTTPException(status_code=400, detail="Email already registered")
+        return await self.session.scalar(
+            insert(User).values(email=user.email, username=user.username, password=hashed_password).returning(User)
+        )
 
     async def get_user_by_email(self, email: str) -> User | None:
         """
         Retrieve a user by their email.
 
+        Cache misses read the primary, so a lagging replica cannot put a revoked
+        role or deactivated account back into the cache after an invalidation.
+
         :param email: The email of the user to retrieve.
         :return: The user if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).where(User.email == email))
-        return result.scalar_one_or_none()
+        user = cached_user(("email", email))
+        if user is not None:
+            return user
+        result = await self.session.execute(select(User).where(User.email == email))
+        return cache_user(result.scalar_one_or_none())
 
-    async def authenticate_user(self, email: str, password: str) -> User | None:
+    async def authenticate_user(self, username: str, password: str) -> User | None:
         """
-        Authenticate a user by their email and password.
+        Authenticate a user by their username and password.
+
+        A password hashed with another bcrypt cost factor than BCRYPT_ROUNDS is
+        rehashed and stored on a successful login.
 
-        :param email: The email of the user.
+        The user is read through a session of its own, closed before the password is
+        checked, so no pooled connection is held while bcrypt runs. The lookup happens
+        inside the password slot, so logins turned away with 503 do not query the database.
+
+        :param username: The username of the user.
         :param password: The password of the user.
         :return: The user if authentication is successful, otherwise None.
         """
-        user = await self.get_user_by_email(email)
-        if not user or not verify_password(password, user.password):
+        async with password_slot():
+            async with Connection()._session_factory() as session:
+                user = await UserService(session).get_user_by_username(username)
+            if not user:
+                return None
+            verified, new_hash = await verify_and_update_password(password, user.password)
+        if not verified:
             return None
+        if new_hash is not None:
+            self._invalidate(user.id)
+            await self.session.execute(update(User).where(User.id == user.id).values(password=new_hash))
         return user
 
-    async def get_users(self, page: int, size: int) -> list[User]:
+    @read_only
+    async def get_users(self, cursor: str | None, size: int) -> Page[UserRead]:
         """
-        Retrieve a list of users with pagination.
+        Retrieve a page of users using keyset pagination.
 
-        :param page: The page number to retrieve.
+        :param cursor: The cursor returned with the previous page, if any.
         :param size: The number of users per page.
-        :return: A list of users.
+        :return: A page of users.
+        """
+        result = await self.session.execute(keyset(select(User), [User.id], cursor, size))
+        return build_page(result.scalars().all(), size, ["id"], UserRead.model_validate)
+
+    async def export_users(
+            self,
+            created_from: datetime | None = None,
+            created_to: datetime | None = None
+    ) -> AsyncIterator[UserRead]:
+        """
+        Stream every user created in a time range through a server-side cursor.
+
+        :param created_from: The inclusive lower bound of `created_at`, if any.
+        :param created_to: The exclusive upper bound of `created_at`, if any.
+        :return: An async iterator over the users.
+        """
+        query = select(User).order_by(User.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        if created_from is not None:
+            query = query.where(User.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(User.created_at < created_to)
+        async for user in stream_scalars(self.session, query):
+            yield UserRead.model_validate(user)
+
+    @property
+    def loader(self) -> BatchLoader:
+        """
+        The request's batch loader of users by ID.
+        """
+        return batch_loader(self.session, "users", self.get_users_by_ids)
+
+    async def get_users_by_ids(self, user_ids: list[int]) -> dict[int, User]:
+        """
+        Retrieve several users, querying the ones missing from the cache at once.
+
+        Like `get_user_by_email`, cache misses read the primary.
+
+        :param user_ids: The IDs of the users to retrieve.
+        :return: The found users by ID.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).offset((page - 1) * size).limit(size))
-        return result.scalars().all()
+        users = {}
+        for user_id in user_ids:
+            user = cached_user(("id", user_id))
+            if user is not None:
+                users[user_id] = user
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            result = await self.session.execute(
+                select(User).where(User.id == any_(literal(missing, ARRAY(Integer))))
+            )
+            for user in result.scalars():
+                users[user.id] = cache_user(user)
+        return users
 
     async def get_user_by_id(self, user_id: int) -> User | None:
         """
-        Retrieve a user by their ID.
+        Retrieve a user by their ID, batched with the other users requested in
+        the same event-loop iteration.
 
         :param user_id: The ID of the user to retrieve.
         :return: The user if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).where(User.id == user_id))
-        return result.scalar_one_or_none()
+        return await self.loader.load(user_id)
 
+    @read_only
     async def get_user_by_username(self, username: str) -> User | None:
         """
         Retrieve a user by their username.
@@ -88,53 +197,66 @@ class UserService:
         :param username: The username of the user to retrieve.
         :return: The user if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).where(User.username == username))
+        result = await self.session.execute(select(User).where(User.username == username))
         return result.scalar_one_or_none()
 
+    async def get_token_version(self, user_id: int) -> int | None:
+        """
+        Retrieve the current token version of a user, cached for a short TTL.
+
+        Only the version column is read, so checking a token does not load the row.
+        The primary is always queried, since a lagging replica could miss a revocation.
+
+        :param user_id: The ID of the user.
+        :return: The token version, or None when the user does not exist.
+        """
+        version = token_version_cache.get(user_id)
+        if version is None:
+            version = await self.session.scalar(select(User.token_version).where(User.id == user_id))
+            if version is not None:
+                token_version_cache.set(user_id, version)
+        return version
+
+    async def revoke_tokens(self, user_id: int) -> None:
+        """
+        Revoke every access and refresh token issued to a user so far.
+
+        :param user_id: The ID of the user.
+        """
+        self._invalidate(user_id)
+        await self.session.execute(
+            update(User).where(User.id == user_id).values(token_version=User.token_version + 1)
+        )
+
     async def update_user(self, user_id: int, data: UserUpdate) -> User | None:
         """
-        Update a user's information by their ID.
+        Update a user's information by their ID with a single UPDATE ... RETURNING.
 
         :param user_id: The ID of the user to update.
-        :param data: The updated user data.
+        :param data: The updated user data; fields left as None are not changed.
         :return: The updated user if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        if user is None:
-            return None
-        for key, value in data.model_dump().items():
-            if value is not None:
-                setattr(user, key, value)
-        async with self.session:
-            self.session.add(user)
-            await self.session.commit()
-            await self.session.refresh(user)
-        return user
+        return await self._update(user_id, data.model_dump(exclude_none=True))
 
     async def patch_user(self, user_id: int, data: UserPatch) -> User | None:
         """
-        Partially update a user's information by their ID.
+        Partially update a user's information by their ID with a single UPDATE ... RETURNING.
 
         :param user_id: The ID of the user to patch.
-        :param data: The partial user data to update.
+        :param data: The partial user data; only the fields that were sent are changed.
         :return: The updated user if found, otherwise None.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        if user is None:
-            return None
-        for key, value in data.model_dump().items():
-            if value is not None:
-                setattr(user, key, value)
-        async with self.session:
-            self.session.add(user)
-            await self.session.commit()
-            await self.session.refresh(user)
-        return user
+        return await self._update(user_id, data.model_dump(exclude_unset=True))
+
+    async def _update(self, user_id: int, values: dict) -> User | None:
+        self._invalidate(user_id)
+        if TOKEN_CLAIM_COLUMNS & values.keys():
+            values["token_version"] = User.token_version + 1
+        return await self.session.scalar(
+            update_by_id(User, user_id, values)
+            .returning(User)
+            .execution_options(populate_existing=True)
+        )
 
     async def delete_user(self, user_id: int) -> None:
         """
@@ -142,14 +264,22 @@ class UserService:
 
         :param user_id: The ID of the user to delete.
         """
-        async with self.session:
-            result = await self.session.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        if user is None:
-            return None
-        async with self.session:    
-            await self.session.delete(user)
-            await self.session.commit()
+        self._invalidate(user_id)
+        await self.session.execute(delete(User).where(User.id == user_id))
+
+    def _invalidate(self, user_id: int) -> None:
+        """
+        Drop a user from the caches now and again once the transaction commits, so
+        a lookup running concurrently with the write cannot cache the old row.
+
+        :param user_id: The ID of the changed user.
+        """
+        def invalidate(*args) -> None:
+            user_cache.delete_where(lambda record: record["id"] == user_id)
+            token_version_cache.delete(user_id)
+
+        invalidate()
+        event.listen(self.session.sync_session, "after_commit", invalidate, once=True)
 
 def get_user_service(session: AsyncSession = Depends(get_session)) -> UserService:
     """
@@ -0,0 +1,86 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    A bounded in-process cache whose entries expire at a given time.
+
+    Entries are evicted least recently used first once `maxsize` is reached, and
+    an expired entry is dropped the next time it is looked up. The cache is meant
+    for the event loop thread only and does no locking.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        """
+        :param maxsize: The maximum number of entries kept.
+        :param ttl: The default lifetime of an entry in seconds, None for no expiry.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up an entry and mark it as recently used.
+
+        :param key: The key of the entry.
+        :param default: The value returned when the entry is missing or expired.
+        :return: The cached value, or `default`.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None) -> None:
+        """
+        Store an entry, evicting the least recently used one when the cache is full.
+
+        :param key: The key of the entry.
+        :param value: The value to cache.
+        :param expires_at: The Unix time the entry expires at; defaults to now plus `ttl`.
+        """
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any], bool]) -> None:
+        """
+        Delete every entry whose value matches a predicate, expired or not.
+
+        :param predicate: Called with each cached value.
+        """
+        for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
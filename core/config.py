@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -13,9 +14,86 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "caffelito_secret_key"
     ALGORITHM: str = "HS256"
 
+    # Database engine and connection pool
+    DB_ECHO: bool = False  # Log every SQL statement, for local debugging only
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds after which a connection is replaced, -1 to disable
+    DB_POOL_PRE_PING: bool = False  # Test connections on checkout, at the cost of a round trip
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Prepared statements cached per asyncpg connection
+
+    # Read replicas, given as a JSON list of "host" or "host:port" entries
+    DB_REPLICA_HOSTS: list[str] = []
+    DB_REPLICA_STRATEGY: Literal["round_robin", "least_connections"] = "round_robin"
+    DB_REPLICA_MAX_LAG: float = 5.0  # Seconds of lag after which a replica stops serving reads
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0  # Seconds between replica health checks
+    DB_READ_YOUR_WRITES_WINDOW: float = 5.0  # Seconds a client reads from the primary after a write
+    DB_RECENT_WRITERS_SIZE: int = 10000  # Clients tracked for read-your-writes per worker
+
+    # Token lifetimes; access tokens stay short since their claims are trusted without a user lookup
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    TOKEN_VERSION_CACHE_TTL: float = 30.0  # Seconds a revocation may take to reach other workers
+
+    # Verified JWTs kept in memory so each token is decoded once per process
+    TOKEN_CACHE_SIZE: int = 10000
+    # Users looked up by authentication, cached per process; the TTL bounds how long
+    # other workers may serve a user changed through this one
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 60.0
+
+    # Password hashing; stored hashes with another cost are rehashed on login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4  # Threads running bcrypt off the event loop
+    PASSWORD_HASH_QUEUE: int = 8  # Hashes allowed to wait for a thread before answering 503
+
+    # WebSocket clients with more unsent messages than this are disconnected
+    WS_SEND_QUEUE_SIZE: int = 100
+
+    # Pub/sub between workers: "postgres" uses LISTEN/NOTIFY, "memory" stays in process
+    PUBSUB_BACKEND: Literal["postgres", "memory"] = "postgres"
+    PUBSUB_CHANNEL: str = "caffelito"
+    PUBSUB_FLUSH_INTERVAL: float = 0.005  # Seconds messages are batched before a NOTIFY
+
+    # Order event feed
+    ORDER_FEED_BUFFER_SIZE: int = 1000  # Recent events kept per worker for resuming clients
+    ORDER_FEED_QUEUE_SIZE: int = 100  # Undelivered events after which a client must resume
+    ORDER_FEED_KEEPALIVE: float = 15.0  # Seconds between keepalives on idle feeds
+    ORDER_FEED_GAP_WINDOW: float = 10.0  # Seconds an event may arrive after higher-numbered ones
+
+    # Carts are edited in memory and persisted write-behind
+    CART_STORE_SIZE: int = 10000  # Carts kept in memory per worker
+    CART_TTL: float = 3600.0  # Seconds an untouched cart stays in memory
+    CART_FLUSH_INTERVAL: float = 5.0  # Seconds between write-behind flushes
+    CART_RETENTION_DAYS: int = 30  # Persisted carts untouched for longer are deleted
+    CART_MAX_QUANTITY: int = 100  # Units of one product a cart may hold
+    CART_MAX_UNITS: int = 500  # Units a cart may hold in total; checkout writes one line item per unit
+
+    # Cache-Control of the catalog GET responses, which carry ETags and require a token,
+    # so they are only stored by the client's own cache unless set otherwise
+    CATALOG_CACHE_CONTROL: str = "private, max-age=60, stale-while-revalidate=600"
+
+    # IDs accepted by one request to a multi-get endpoint such as /products/batch
+    MULTI_GET_MAX_IDS: int = 100
+
+    # Responses to requests sent with an Idempotency-Key, replayed to retries
+    IDEMPOTENCY_TTL: float = 86400.0  # Seconds a response is replayed for
+    IDEMPOTENCY_CACHE_SIZE: int = 10000  # Responses kept in memory per worker
+
+    def database_url(self, host: str, port: str) -> str:
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{host}:{port}/{self.DB_NAME}"
+
     @property
     def DATABASE_URL(self) -> str:
-        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+        return self.database_url(self.DB_HOST, self.DB_PORT)
+
+    @property
+    def REPLICA_URLS(self) -> list[str]:
+        return [
+            self.database_url(*(entry.split(":", 1) if ":" in entry else (entry, self.DB_PORT)))
+            for entry in self.DB_REPLICA_HOSTS
+        ]
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -1,41 +1,184 @@
+import time
+from collections import deque
 from collections.abc import AsyncGenerator
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 from core.config import settings
+from core.replicas import Replica, ReplicaSet, in_read_only, mark_write, wrote_recently
+
+
+class PoolStats:
+    """
+    Counters of connection checkouts from a pool.
+    """
+
+    def __init__(self, samples: int = 1024):
+        self.acquires = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        # Latencies of the most recent checkouts, used for percentiles
+        self.recent = deque(maxlen=samples)
+
+    def record(self, latency: float, waited: bool) -> None:
+        self.acquires += 1
+        self.waits += waited
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.recent.append(latency)
+
+    def as_dict(self) -> dict:
+        recent = sorted(self.recent)
+
+        def percentile(p: float) -> float:
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 3) if recent else 0.0
+
+        return {
+            "acquires": self.acquires,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "acquire_ms_avg": round(self.total_latency / self.acquires * 1000, 3) if self.acquires else 0.0,
+            "acquire_ms_p50": percentile(0.5),
+            "acquire_ms_p99": percentile(0.99),
+            "acquire_ms_max": round(self.max_latency * 1000, 3),
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout takes and whether it had to wait.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        # The checkout has to wait when no connection is idle and no overflow slot is left
+        waited = self._pool.empty() and -1 < self._max_overflow <= self._overflow
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record(time.perf_counter() - started, waited)
+
+
+def create_engine(url: str):
+    # Create an asynchronous engine using the pool settings
+    return create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+    )
+
+
+def pool_status(engine) -> dict:
+    # Report the current state of an engine's connection pool and its checkout statistics
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        **pool.stats.as_dict(),
+    }
+
+
+class RoutingSession(Session):
+    """
+    Session sending the queries of read-only service methods to a replica.
+
+    Everything else goes to the primary: writes, flushes, any query of a session
+    that has already written, and the reads of a client that wrote recently. A
+    session keeps reading the same replica while it stays healthy.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+            # Entities memoized by the batch loaders of the request may be stale now
+            self.info.pop("loaders", None)
+            mark_write()
+        elif in_read_only() and not self.info.get("wrote") and not wrote_recently():
+            # One replica serves every read of the session, so the reads of a request
+            # see the same snapshot, e.g. a table version and the rows it describes
+            replica = self.info.get("replica")
+            if replica is None or not replica.healthy:
+                replica = self.info["replica"] = Connection._replicas.choose()
+            if replica is not None:
+                return replica.engine.sync_engine
+        return Connection._engine.sync_engine
+
 
 class Connection:
     # Singleton instance variables
     _instance = None
     _engine = None
+    _replicas = None
     _session_factory = None
 
     def __new__(cls, *args, **kwargs):
         # Implementing Singleton pattern to ensure only one instance
         if not cls._instance:
             cls._instance = super(Connection, cls).__new__(cls, *args, **kwargs)
-            # Create an asynchronous engine using the database URL from settings
-            cls._engine = create_async_engine(
-                settings.DATABASE_URL,
-                echo=True,  # Enable SQLAlchemy logging
-            )
-            # Create a session factory bound to the engine
+            # Create the primary engine and one engine per read replica
+            cls._engine = create_engine(settings.DATABASE_URL)
+            cls._replicas = ReplicaSet([
+                Replica(host, create_engine(url))
+                for host, url in zip(settings.DB_REPLICA_HOSTS, settings.REPLICA_URLS)
+            ])
+            # Create a session factory routing each query to the primary or a replica
             cls._session_factory = sessionmaker(
-                bind=cls._engine,
                 class_=AsyncSession,
+                sync_session_class=RoutingSession,
                 expire_on_commit=False
             )
         return cls._instance
 
     async def get_session(self):
-        # Provide an asynchronous session generator
+        # Provide a unit of work: one session and transaction, committed once at the end
         async with self._session_factory() as session:
-            yield session
+            async with session.begin():
+                yield session
+
+    async def start(self):
+        # Check the replicas and keep monitoring their health and lag
+        await self._replicas.start()
+
+    def pool_status(self) -> dict:
+        # Report the pools of the primary and of every replica
+        return {
+            **pool_status(self._engine),
+            "replicas": [
+                {"host": replica.name, "healthy": replica.healthy, "lag": replica.lag, **pool_status(replica.engine)}
+                for replica in self._replicas.replicas
+            ],
+        }
 
     async def close(self):
-        # Dispose of the engine to close all connections
+        # Dispose of the engines to close all connections
+        await self._replicas.close()
         await self._engine.dispose()
 
-# Function to get a session, used outside the Connection class
+# Function to get the request-scoped unit of work, used as a FastAPI dependency.
+# Services share one session and transaction per request and only queue or flush
+# their changes; the transaction is committed once when the request succeeds and
+# rolled back when it raises.
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with Connection()._session_factory() as session:
-        yield session
+        async with session.begin():
+            yield session
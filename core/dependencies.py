@@ -1,36 +1,49 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
+from pydantic import BaseModel
+from core.connections import Connection
 from core.jwt import JwtBearer, JWTHandler
-from jose.exceptions import JWTError
 from apps.users.services import UserService, get_user_service
 
+
+class Principal(BaseModel):
+    """
+    The authenticated caller as described by the claims of its access token.
+    """
+    id: int
+    email: str
+    role: str
+    is_active: bool
+
+
 class UserHandling:
     def __init__(self) -> None:
         # Initialize the UserHandling class
         pass
 
-    async def user(self, token: str = Depends(JwtBearer()), service: UserService = Depends(get_user_service)):
+    async def user(
+            self,
+            request: Request,
+            token: str = Depends(JwtBearer()),
+            service: UserService = Depends(get_user_service)
+    ):
         # Method to retrieve a user based on a JWT token
-        try:
-            # Decode the JWT token to get the payload
-            payload = await JWTHandler().decode_jwt(token)
-            # Determine the user from the payload and service
-            user = await UserHandling.determine_user(payload=payload, service=service)
-            return user
-        except JWTError:
-            # Raise an HTTP exception if the token is invalid
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
+        # JwtBearer has already verified the token and attached its payload to the request
+        payload = request.state.token_payload
+        # Determine the user from the payload and service
+        user = await UserHandling.determine_user(payload=payload, service=service)
+        return user
 
     @staticmethod
     async def determine_user(payload: dict, service: UserService):
         # Static method to determine the user from the payload
-        user_email = payload.get("sub")  # Extract the user email from the payload
-        user = await service.get_user_by_email(user_email)  # Retrieve the user by email
-        if user is None:
-            # Raise an HTTP exception if the user is not found
+        # Retrieve the user by the ID claim through the request's batch loader, so later
+        # lookups of the same user in the request are free; tokens without it use the email
+        if "uid" in payload:
+            user = await service.get_user_by_id(payload["uid"])
+        else:
+            user = await service.get_user_by_email(payload.get("sub"))
+        if user is None or payload.get("ver", user.token_version) != user.token_version:
+            # Raise an HTTP exception if the user is not found or the token was revoked
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Could not validate credentials",
@@ -38,16 +51,41 @@ class UserHandling:
             )
         return user
 
-    async def token_data(self, token: str = Depends(JwtBearer())):
-        # Method to retrieve the payload data from a JWT token
-        try:
-            # Decode the JWT token to get the payload
-            payload = await JWTHandler().decode_jwt(token)
-            return payload
-        except JWTError:
-            # Raise an HTTP exception if the token is invalid
+    async def principal(
+            self,
+            request: Request,
+            token: str = Depends(JwtBearer()),
+            service: UserService = Depends(get_user_service)
+    ) -> Principal:
+        # Method to authorize a request from the token claims, without loading the user row
+        return await UserHandling.authorize(request.state.token_payload, service)
+
+    @staticmethod
+    async def principal_from_token(token: str) -> Principal:
+        # Static method to authorize a token passed in the query string, for WebSocket and
+        # EventSource clients that cannot send an Authorization header. A session of its own
+        # is used, so a long-lived connection does not hold one.
+        payload = await JWTHandler().decode_jwt(token)
+        if not payload or payload.get("typ") == "refresh":
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or Expaired Token!")
+        async with Connection()._session_factory() as session:
+            return await UserHandling.authorize(payload, UserService(session))
+
+    @staticmethod
+    async def authorize(payload: dict, service: UserService) -> Principal:
+        # Static method to build the principal from verified token claims
+        # Only the cached token version is checked, so revoked tokens are refused
+        if "uid" not in payload or payload.get("ver") != await service.get_token_version(payload["uid"]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
+                headers={"WWW-Authenticate": "Bearer"}
             )
+        if not payload["is_active"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+        return Principal(id=payload["uid"], email=payload["sub"], role=payload["role"], is_active=payload["is_active"])
+
+    async def token_data(self, request: Request, token: str = Depends(JwtBearer())):
+        # Method to retrieve the payload data from a JWT token
+        # The payload was verified by JwtBearer, so it is not decoded again
+        return request.state.token_payload
@@ -0,0 +1,64 @@
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import String, any_, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
+from core.connections import get_session
+from core.models import TableVersion
+from core.replicas import read_only
+
+
+@read_only
+async def get_table_versions(session: AsyncSession, tables: list[str]) -> dict[str, int]:
+    """
+    Retrieve the versions of tables, bumped by a trigger on every write to them.
+
+    :param session: An asynchronous database session.
+    :param tables: The names of the tables.
+    :return: The versions by table name.
+    """
+    result = await session.execute(
+        select(TableVersion.table_name, TableVersion.version)
+        .where(TableVersion.table_name == any_(literal(tables, ARRAY(String))))
+    )
+    return dict(result.tuples().all())
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Tell whether an If-None-Match header lists an ETag, using the weak comparison it calls for.
+
+    :param if_none_match: The header value, if sent.
+    :param etag: The current ETag.
+    :return: Whether the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def table_etag(*tables: str):
+    """
+    Build a dependency making GET responses conditional on the versions of tables.
+
+    The ETag only changes when one of the tables is written, so a client or edge
+    cache revalidating an unchanged response gets a 304 after a primary key
+    lookup, before the endpoint runs its query. The version and the response are
+    read through the same session, hence from the same replica. Responses carry
+    the CATALOG_CACHE_CONTROL header and vary by Authorization.
+
+    :param tables: The tables the response is built from.
+    :return: The dependency, which raises a 304 HTTPException when the client's copy is current.
+    """
+    async def dependency(request: Request, response: Response, session: AsyncSession = Depends(get_session)) -> None:
+        versions = await get_table_versions(session, list(tables))
+        etag = '"' + "-".join(f"{table}.{versions.get(table, 0)}" for table in tables) + '"'
+        # The endpoints require a token, so shared caches must key responses by it
+        headers = {"ETag": etag, "Cache-Control": settings.CATALOG_CACHE_CONTROL, "Vary": "Authorization"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import json
+from core.cache import TTLCache
+from core.config import settings
+from core.replicas import client_key
+
+HEADER = b"idempotency-key"
+
+# Responses to requests sent with an idempotency key, shared by every path of this worker
+idempotency_cache = TTLCache(maxsize=settings.IDEMPOTENCY_CACHE_SIZE, ttl=settings.IDEMPOTENCY_TTL)
+
+
+class StoredResponse:
+    """
+    A complete response kept for replaying to retries of the same request.
+    """
+
+    def __init__(self, fingerprint: str, status: int, headers: list, body: bytes):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware making POST requests that carry an `Idempotency-Key` header safe to retry.
+
+    The first response to a key is stored for IDEMPOTENCY_TTL seconds and replayed
+    to retries, marked with an `Idempotent-Replayed` header. A duplicate arriving
+    while the first request is still running waits for it instead of running the
+    handler again. Keys are scoped to the client, as identified by ClientKeyMiddleware
+    which must wrap this one, and to the path; reusing a key with another request
+    body is rejected with 422.
+
+    Responses with a 5xx status are not stored, so those requests can be retried.
+    Stored responses live in the worker's memory, so retries reaching another
+    worker are not deduplicated.
+    """
+
+    def __init__(self, app, paths: set[str]):
+        """
+        :param app: The ASGI application.
+        :param paths: The paths whose POST requests honor idempotency keys.
+        """
+        self.app = app
+        self.paths = paths
+        self.responses = idempotency_cache
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(HEADER)
+        if not idempotency_key:
+            return await self.app(scope, receive, send)
+
+        body, receive = await self._read_body(receive)
+        key = hashlib.sha256(
+            b"\0".join([(client_key() or "").encode(), scope["path"].encode(), idempotency_key])
+        ).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        while True:
+            stored = self.responses.get(key)
+            if stored is not None:
+                return await self._replay(stored, fingerprint, send)
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            # The same request is running; its response is replayed once it completes
+            await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            await self._run(scope, receive, send, key, fingerprint)
+        finally:
+            del self._inflight[key]
+            future.set_result(None)
+
+    async def _read_body(self, receive):
+        # Buffer the request body to fingerprint it, then hand it to the application again
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        sent = False
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return body, replay_receive
+
+    async def _run(self, scope, receive, send, key: str, fingerprint: str) -> None:
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        if start and start["status"] < 500:
+            self.responses.set(
+                key, StoredResponse(fingerprint, start["status"], list(start.get("headers", [])), b"".join(chunks))
+            )
+
+    async def _replay(self, stored: StoredResponse, fingerprint: str, send) -> None:
+        if stored.fingerprint != fingerprint:
+            detail = {"detail": "Idempotency-Key reused with a different request body"}
+            body = json.dumps(detail, separators=(",", ":")).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 422,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
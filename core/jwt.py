@@ -1,18 +1,28 @@
+import hashlib
 from datetime import datetime, timedelta
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import HTTPException, Request, status
 from jose import jwt
 from jose.exceptions import ExpiredSignatureError, JWTError
 from time import time
+from core.cache import TTLCache
 from core.models import User
 from core.config import settings
 
+# Payloads of verified tokens keyed by the token's SHA-256, each expiring with its token
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
 
 class JWTHandler:
     def __init__(self) -> None:
         pass
 
     async def decode_jwt(self, token: str):
+        # The signature and claims of a token are checked once; later calls hit the cache
+        key = hashlib.sha256(token.encode()).digest()
+        payload = token_cache.get(key)
+        if payload is not None:
+            return payload
         try:
             decode_token = jwt.decode(
                 token,
@@ -21,19 +31,43 @@ class JWTHandler:
                 audience="users",
                 issuer="auth"
                 )
-            return decode_token if decode_token['exp'] >= time() else None
-        except ExpiredSignatureError or JWTError:
+        except (ExpiredSignatureError, JWTError):
             return {}
+        if decode_token['exp'] < time():
+            return None
+        token_cache.set(key, decode_token, expires_at=decode_token['exp'])
+        return decode_token
 
-    async def create_token(self, user: User):
+    async def create_token(self, user: User, token_type: str = "access"):
         issuer = "auth"
         audience = "users"
-        expires_delta = timedelta(days=1)
+        if token_type == "refresh":
+            expires_delta = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        else:
+            expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         expire = datetime.utcnow() + expires_delta
-        to_encode = {"sub": user.email, "exp": expire, "iss": issuer, "aud": audience}
+        to_encode = {
+            "sub": user.email,
+            "exp": expire,
+            "iss": issuer,
+            "aud": audience,
+            "typ": token_type,
+            # Claims that let requests authorize without loading the user row
+            "uid": user.id,
+            "role": user.role,
+            "is_active": user.is_active,
+            "ver": user.token_version,
+        }
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
 
+    async def create_token_pair(self, user: User):
+        return {
+            "access_token": await self.create_token(user),
+            "refresh_token": await self.create_token(user, token_type="refresh"),
+            "token_type": "Bearer",
+        }
+
 
 class JwtBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
@@ -50,13 +84,16 @@ class JwtBearer(HTTPBearer):
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Invalid or Expaired Token!"
                 )
-            token_status = await self.verify_jwt(
+            payload = await self.verify_jwt(
                 jwtoken=credentials.credentials)
-            if not token_status:
+            # Refresh tokens are only accepted by the refresh endpoint
+            if not payload or payload.get("typ") == "refresh":
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Invalid or Expaired Token!"
                 )
+            # Later dependencies read the verified payload instead of decoding again
+            request.state.token_payload = payload
             return credentials.credentials
         else:
             raise HTTPException(
@@ -65,8 +102,5 @@ class JwtBearer(HTTPBearer):
             )
 
     async def verify_jwt(self, jwtoken: str):
-        is_token_valid: bool = False  # a false flag
-        payload = await JWTHandler().decode_jwt(token=jwtoken)
-        if payload:
-            is_token_valid = True
-        return is_token_valid
+        # Returns the payload of a valid token, otherwise a falsy value
+        return await JWTHandler().decode_jwt(token=jwtoken)
@@ -0,0 +1,88 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class BatchLoader:
+    """
+    Loads entities by key in batches, DataLoader style.
+
+    Every key requested within one event-loop iteration is loaded with a single
+    call of the batch function, and each result is memoized so asking for the
+    same key again costs nothing. A key the batch function does not return
+    resolves to None.
+    """
+
+    def __init__(self, load: Callable[[list], Awaitable[dict]]):
+        """
+        :param load: The batch function, taking a list of keys and returning the
+            found entities by key.
+        """
+        self._load = load
+        self._results: dict[Hashable, asyncio.Future] = {}
+        self._pending: list[Hashable] = []
+        # Batch calls in flight, referenced so they are not garbage collected
+        self._batches: set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable):
+        """
+        Load one entity, batched with the other keys requested in the same iteration.
+
+        :param key: The key of the entity.
+        :return: The entity, or None when it does not exist.
+        """
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._results[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                # Dispatch once the callers already scheduled in this iteration have queued their keys
+                loop.call_soon(self._dispatch)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> dict:
+        """
+        Load several entities with at most one batch call.
+
+        :param keys: The keys of the entities, possibly repeated.
+        :return: The entities by key, None for the missing ones.
+        """
+        keys = list(dict.fromkeys(keys))
+        return dict(zip(keys, await asyncio.gather(*(self.load(key) for key in keys))))
+
+    def _dispatch(self) -> None:
+        keys, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run(keys))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run(self, keys: list) -> None:
+        try:
+            found = await self._load(keys)
+        except Exception as e:
+            for key in keys:
+                # Forget failed keys, so a later load retries them
+                self._results.pop(key).set_exception(e)
+        else:
+            for key in keys:
+                self._results[key].set_result(found.get(key))
+
+
+def batch_loader(session: AsyncSession, name: str, load: Callable[[list], Awaitable[dict]]) -> BatchLoader:
+    """
+    Retrieve the batch loader of a session, creating it on first use.
+
+    Loaders live in the session, so their results are memoized for the rest of
+    the request; `RoutingSession` drops them when the session writes.
+
+    :param session: The session of the request.
+    :param name: The name of the loader, usually the entity it loads.
+    :param load: The batch function used if the loader is created.
+    :return: The batch loader.
+    """
+    loaders = session.info.setdefault("loaders", {})
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = BatchLoader(load)
+    return loader
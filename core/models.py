@@ -2,7 +2,7 @@ import datetime as dt
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import BigInteger, Integer, String, Boolean, DateTime, Float, ForeignKey, Index, Sequence, UniqueConstraint
 
 # Create a base class for declarative class definitions
 Base = declarative_base()
@@ -12,11 +12,11 @@ class BaseModel(Base):
     __abstract__ = True  # Indicates this class is abstract and not mapped to a table
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.now(),
-        onupdate=datetime.now()
+        default=datetime.now,
+        onupdate=datetime.now
     )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
@@ -30,8 +30,10 @@ class User(BaseModel):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_verified: Mapped[bool] = mapped_column(Boolean, default=False)
     role: Mapped[str] = mapped_column(String, default="user")  # Possible roles: 'user', 'admin'
+    # Bumped to revoke every token issued to the user
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     orders: Mapped[list["Order"]] = relationship(back_populates="user")
-    # cart: Mapped["Cart"] = relationship(back_populates="user")
+    cart: Mapped["Cart"] = relationship(back_populates="user")
 
     def __repr__(self):
         # String representation of the User object
@@ -55,7 +57,7 @@ class Product(BaseModel):
     name: Mapped[str] = mapped_column(String, nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=True)
     price: Mapped[float] = mapped_column(Float, nullable=False)
-    category_id: Mapped[int] = mapped_column(Integer, ForeignKey("categories.id"), nullable=False)
+    category_id: Mapped[int] = mapped_column(Integer, ForeignKey("categories.id"), nullable=False, index=True)
     category: Mapped["Category"] = relationship(back_populates="products")
     order_products: Mapped[list["OrderProduct"]] = relationship(back_populates="product")
 
@@ -65,6 +67,13 @@ class Product(BaseModel):
 # Order model representing a customer's order
 class Order(BaseModel):
     __tablename__ = "orders"
+    # The first index serves the keyset pages of a user's order history, newest first,
+    # and lookups by user_id alone, so user_id has no index of its own; the second
+    # serves the pages of every order
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
 
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     user: Mapped["User"] = relationship(back_populates="orders")
@@ -73,25 +82,55 @@ class Order(BaseModel):
     def __repr__(self):
         return f"<Order id={self.id} user_id={self.user_id}>"
 
+# Numbers the order change events, so feed clients can resume after the last one they saw
+order_events_seq = Sequence("order_events_seq", metadata=Base.metadata)
+
 # OrderProduct model representing the association between orders and products
 class OrderProduct(BaseModel):
     __tablename__ = "order_products"
+    # Also serves lookups by order_id alone, so order_id has no index of its own
+    __table_args__ = (Index("ix_order_products_order_id_product_id", "order_id", "product_id"),)
 
     order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.id"), nullable=False)
     order: Mapped["Order"] = relationship(back_populates="order_products")
-    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     product: Mapped["Product"] = relationship(back_populates="order_products")
 
     def __repr__(self):
         return f"<OrderProduct id={self.id} order_id={self.order_id} product_id={self.product_id}>"
 
-# Cart model representing a user's shopping cart (commented out)
-# class Cart(BaseModel):
-#     __tablename__ = "carts"
+# Cart model representing a user's shopping cart, persisted write-behind from the cart store
+class Cart(BaseModel):
+    __tablename__ = "carts"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
+    user: Mapped["User"] = relationship(back_populates="cart")
+    items: Mapped[list["CartItem"]] = relationship(back_populates="cart")
+
+    def __repr__(self):
+        return f"<Cart id={self.id} user_id={self.user_id}>"
+
+# CartItem model representing a product and its quantity in a cart
+class CartItem(BaseModel):
+    __tablename__ = "cart_items"
+    # Also serves lookups by cart_id alone, so cart_id has no index of its own
+    __table_args__ = (UniqueConstraint("cart_id", "product_id"),)
 
-#     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
-#     user: Mapped["User"] = relationship(back_populates="cart")
-#     products: Mapped[list["Product"]] = relationship(back_populates="cart")
+    cart_id: Mapped[int] = mapped_column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False)
+    cart: Mapped["Cart"] = relationship(back_populates="items")
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
 
-#     def __repr__(self):
-#         return f"<Cart id={self.id} user_id={self.user_id}>"
+    def __repr__(self):
+        return f"<CartItem id={self.id} cart_id={self.cart_id} product_id={self.product_id} quantity={self.quantity}>"
+
+# TableVersion model holding a counter bumped by a trigger on every write to a table,
+# from which the ETags of that table's GET responses are derived
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<TableVersion table_name={self.table_name} version={self.version}>"
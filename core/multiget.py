@@ -0,0 +1,51 @@
+from typing import Any, Callable, Generic, Sequence, TypeVar
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+
+from core.config import settings
+
+T = TypeVar("T")
+
+
+class MultiGet(BaseModel, Generic[T]):
+    """
+    Entities fetched by ID, in the order they were requested.
+    """
+    items: list[T | None]
+    missing: list[int]
+
+
+def parse_ids(ids: str = Query(..., description="Comma-separated IDs, e.g. 1,2,3")) -> list[int]:
+    """
+    Dependency parsing the `ids` query parameter of a multi-get endpoint.
+
+    :param ids: The comma-separated IDs.
+    :return: The IDs in request order, repeats included.
+    """
+    try:
+        parsed = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid ids")
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid ids")
+    if len(parsed) > settings.MULTI_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MULTI_GET_MAX_IDS} ids can be requested at once"
+        )
+    return parsed
+
+
+def build_multiget(ids: Sequence[int], found: dict[int, Any], serialize: Callable[[Any], T]) -> MultiGet[T]:
+    """
+    Build a multi-get response from the entities found for the requested IDs.
+
+    :param ids: The requested IDs, in request order.
+    :param found: The found entities by ID; missing IDs map to None or are absent.
+    :param serialize: The callable turning an entity into its response schema.
+    :return: The entities in request order, None for each missing ID, and the missing IDs.
+    """
+    items = [serialize(found[entity_id]) if found.get(entity_id) is not None else None for entity_id in ids]
+    missing = list(dict.fromkeys(entity_id for entity_id in ids if found.get(entity_id) is None))
+    return MultiGet(items=items, missing=missing)
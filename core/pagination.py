@@ -0,0 +1,103 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Generic, Sequence, TypeVar
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import DateTime, Integer, Select, tuple_
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """
+    A page of results together with the cursor pointing at the next page.
+    """
+    items: list[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(*values) -> str:
+    """
+    Encode the keyset values of the last row of a page into an opaque cursor.
+
+    :param values: The values of the ordering columns of the last row.
+    :return: A URL-safe cursor string.
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    """
+    Decode a cursor produced by `encode_cursor` and check its values against the
+    ordering columns, so a malformed cursor is rejected before reaching the database.
+
+    :param cursor: The opaque cursor string.
+    :param columns: The ordering columns the cursor must hold one value for each.
+    :return: The list of keyset values, with datetimes parsed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    decoded = []
+    for column, value in zip(columns, values):
+        try:
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Integer) and (not isinstance(value, int) or isinstance(value, bool)):
+                raise ValueError(value)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def keyset(query: Select, columns: Sequence, cursor: str | None, size: int, descending: bool = False) -> Select:
+    """
+    Apply keyset pagination to a query.
+
+    Rows are ordered by `columns` and only rows after the cursor are selected, so
+    the database can seek straight to the page through an index instead of
+    scanning and discarding every row before it. One extra row is fetched so
+    `build_page` can tell whether a next page exists.
+
+    :param query: The query to paginate.
+    :param columns: The ordering columns; the last one must be unique.
+    :param cursor: The cursor of the previous page, if any.
+    :param size: The number of rows per page.
+    :param descending: Whether to order by every column descending, e.g. newest first;
+        an ascending index on the columns is then scanned backwards.
+    :return: The paginated query.
+    """
+    if cursor is not None:
+        values = decode_cursor(cursor, columns)
+        if len(columns) == 1:
+            after = columns[0] < values[0] if descending else columns[0] > values[0]
+        else:
+            after = tuple_(*columns) < tuple_(*values) if descending else tuple_(*columns) > tuple_(*values)
+        query = query.where(after)
+    order = [column.desc() for column in columns] if descending else columns
+    return query.order_by(*order).limit(size + 1)
+
+
+def build_page(rows: Sequence, size: int, keys: Sequence[str], serialize: Callable[[Any], T]) -> Page[T]:
+    """
+    Build a page from the rows fetched by a `keyset` query.
+
+    :param rows: The fetched rows, possibly one more than `size`.
+    :param size: The number of rows per page.
+    :param keys: The attribute names of the ordering columns.
+    :param serialize: The callable turning a row into its response schema.
+    :return: The page of serialized rows.
+    """
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(*(getattr(rows[-1], key) for key in keys))
+    return Page(items=[serialize(row) for row in rows], next_cursor=next_cursor)
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable
+
+import asyncpg
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay under 8000 bytes; leave room for the envelope
+MAX_PAYLOAD_SIZE = 7800
+# Seconds between reconnection attempts of the listening connection
+RECONNECT_DELAY = 1.0
+
+Handler = Callable[[str], None]
+
+
+class Backplane(ABC):
+    """
+    Publish/subscribe between the workers of the application.
+
+    Handlers are called on the event loop of the worker with each message
+    published to their channel by any worker, this one included. Publishing is
+    synchronous and only queues the message, so it is safe to call from request
+    handlers and from other handlers.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """
+        Call a handler with every message published to a channel.
+
+        :param channel: The channel name.
+        :param handler: A synchronous callable taking the message.
+        """
+        self._handlers[channel].append(handler)
+
+    def unsubscribe(self, channel: str, handler: Handler) -> None:
+        handlers = self._handlers.get(channel)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self._handlers[channel]
+
+    @abstractmethod
+    def publish(self, channel: str, message: str) -> None:
+        """
+        Queue a message for every subscriber of a channel, in every worker.
+
+        :param channel: The channel name.
+        :param message: The message, usually JSON.
+        """
+
+    def _dispatch(self, channel: str, message: str) -> None:
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Handler of channel %s failed", channel)
+
+    def stats(self) -> dict:
+        return {}
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackplane(Backplane):
+    """
+    A backplane that only reaches the current process, for a single worker and tests.
+    """
+
+    def publish(self, channel: str, message: str) -> None:
+        self._dispatch(channel, message)
+
+
+class PostgresBackplane(Backplane):
+    """
+    A backplane over Postgres LISTEN/NOTIFY on a dedicated asyncpg connection.
+
+    Messages published within one flush interval are packed into as few NOTIFY
+    payloads as possible, so the NOTIFY rate follows the publish rate rather than
+    the number of clients. Each worker delivers its own messages locally right
+    away and ignores their echo from Postgres.
+    """
+
+    def __init__(self, dsn: str, channel: str, flush_interval: float):
+        """
+        :param dsn: The libpq connection string of the database.
+        :param channel: The Postgres notification channel shared by all workers.
+        :param flush_interval: Seconds messages are buffered before being sent.
+        """
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.worker_id = uuid.uuid4().hex
+        self._connection: asyncpg.Connection | None = None
+        self._buffer: list[tuple[str, str]] = []
+        # Created on start, so it belongs to the running event loop
+        self._pending: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.notifies = 0
+        self.published = 0
+
+    def publish(self, channel: str, message: str) -> None:
+        self.published += 1
+        self._dispatch(channel, message)
+        if self._pending is not None:
+            self._buffer.append((channel, message))
+            self._pending.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._pending = asyncio.Event()
+            await self._connect()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _connect(self) -> None:
+        self._connection = await asyncpg.connect(self.dsn)
+        await self._connection.add_listener(self.channel, self._on_notify)
+        # Wake the flush loop when the connection drops so it reconnects and listens again
+        self._connection.add_termination_listener(self._wake)
+
+    def _wake(self, *args) -> None:
+        if self._pending is not None:
+            self._pending.set()
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring a malformed notification on %s", channel)
+            return
+        if envelope.get("w") == self.worker_id:
+            return
+        for channel, message in envelope.get("m", ()):
+            self._dispatch(channel, message)
+
+    def _batches(self, messages: list[tuple[str, str]]) -> list[str]:
+        # Pack messages into JSON envelopes that each fit in one NOTIFY payload
+        batches, batch, size = [], [], 0
+        for channel, message in messages:
+            item = json.dumps([channel, message])
+            item_size = len(item.encode())
+            if item_size > MAX_PAYLOAD_SIZE:
+                logger.warning("Dropping a %d byte message too large for NOTIFY", item_size)
+                continue
+            if batch and size + item_size > MAX_PAYLOAD_SIZE:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(item)
+            size += item_size + 1
+        if batch:
+            batches.append(batch)
+        return [f'{{"w":"{self.worker_id}","m":[{",".join(batch)}]}}' for batch in batches]
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._pending.clear()
+            messages, self._buffer = self._buffer, []
+            try:
+                if self._connection is None or self._connection.is_closed():
+                    await self._connect()
+                for payload in self._batches(messages):
+                    await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                    self.notifies += 1
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                # Messages of a failed flush were already delivered locally; other
+                # workers miss them, as they would any message sent while disconnected
+                logger.warning("Backplane flush failed, reconnecting: %s", e)
+                self._connection = None
+                await asyncio.sleep(RECONNECT_DELAY)
+                self._pending.set()
+
+    def stats(self) -> dict:
+        return {"published": self.published, "notifies": self.notifies, "buffered": len(self._buffer)}
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._pending = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+
+def create_backplane() -> Backplane:
+    if settings.PUBSUB_BACKEND == "memory":
+        return MemoryBackplane()
+    dsn = settings.database_url(settings.DB_HOST, settings.DB_PORT).replace("postgresql+asyncpg://", "postgresql://")
+    return PostgresBackplane(dsn, settings.PUBSUB_CHANNEL, settings.PUBSUB_FLUSH_INTERVAL)
+
+
+# The backplane of this worker, started with the application
+backplane = create_backplane()
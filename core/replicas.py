@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import logging
+from contextvars import ContextVar
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.cache import TTLCache
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Replication lag in seconds; zero when the replica has replayed everything it received
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Set while a read-only service method runs, so its queries may go to a replica
+_read_only: ContextVar[bool] = ContextVar("read_only", default=False)
+# Identifies the client of the current request for read-your-writes stickiness
+_client_key: ContextVar[str | None] = ContextVar("client_key", default=None)
+# Clients that wrote within the read-your-writes window; evicting one early only
+# lets its reads go back to a replica a little sooner
+_recent_writers = TTLCache(maxsize=settings.DB_RECENT_WRITERS_SIZE, ttl=settings.DB_READ_YOUR_WRITES_WINDOW)
+
+
+def read_only(method):
+    """
+    Mark a service method as read-only so its queries may be sent to a replica.
+    """
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def in_read_only() -> bool:
+    return _read_only.get()
+
+
+def client_key() -> str | None:
+    """
+    :return: The key identifying the client of the current request, set by ClientKeyMiddleware.
+    """
+    return _client_key.get()
+
+
+def mark_write() -> None:
+    """
+    Pin the reads of the current client to the primary for a short window.
+    """
+    key = _client_key.get()
+    # Without replicas every read already goes to the primary
+    if key is not None and settings.DB_REPLICA_HOSTS:
+        _recent_writers.set(key, True)
+
+
+def wrote_recently() -> bool:
+    key = _client_key.get()
+    return key is not None and _recent_writers.get(key, False)
+
+
+class ClientKeyMiddleware:
+    """
+    ASGI middleware identifying the client of each request for read-your-writes.
+
+    The client is its bearer token when it sends one, otherwise its address.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        authorization = dict(scope["headers"]).get(b"authorization")
+        if authorization:
+            key = hashlib.sha256(authorization).hexdigest()
+        else:
+            key = scope["client"][0] if scope.get("client") else None
+        token = _client_key.set(key)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _client_key.reset(token)
+
+
+class Replica:
+    """
+    A read replica engine together with its last known health.
+    """
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag: float | None = None
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as connection:
+                self.lag = float(await connection.scalar(LAG_QUERY))
+            self.healthy = self.lag <= settings.DB_REPLICA_MAX_LAG
+        except Exception as e:
+            logger.warning("Replica %s failed its health check: %s", self.name, e)
+            self.lag = None
+            self.healthy = False
+
+
+class ReplicaSet:
+    """
+    Chooses a healthy replica for each read and keeps the replicas' health up to date.
+    """
+
+    def __init__(self, replicas: list[Replica]):
+        self.replicas = replicas
+        self._counter = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    def choose(self) -> Replica | None:
+        """
+        Pick a healthy replica with the configured strategy.
+
+        :return: The replica, or None when no replica is healthy.
+        """
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if settings.DB_REPLICA_STRATEGY == "least_connections":
+            return min(healthy, key=lambda replica: replica.engine.pool.checkedout())
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def check(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def start(self) -> None:
+        if self.replicas and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._monitor())
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
+            await self.check()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
@@ -1,9 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a cost other than BCRYPT_ROUNDS are reported as needing an update,
+# so they are rehashed the next time their user logs in
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# bcrypt releases the GIL while hashing, so a thread pool keeps it off the event loop
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+# Logins and registrations running or waiting for a worker; beyond this, requests are
+# turned away. Each holder uses at most one pooled connection at a time, so the slots
+# stay below the pool size to leave connections for the other requests
+_slots = asyncio.Semaphore(min(
+    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE,
+    settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW - 1,
+))
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(password, hashed_password)
+
+@asynccontextmanager
+async def password_slot():
+    """
+    Reserve a slot for a password check, or turn the request away with 503 when a
+    login storm has taken them all. The hashing functions must be called inside it,
+    and so should the database lookups they depend on, so a rejected request never
+    queries the database.
+    """
+    # Reject instead of queueing without bound when a login storm saturates the pool
+    if _slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password checks in progress, try again later",
+            headers={"Retry-After": "1"},
+        )
+    async with _slots:
+        yield
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password on the bcrypt worker pool, inside a `password_slot`.
+
+    :param password: The plain text password.
+    :return: The bcrypt hash.
+    """
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_and_update_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify a password on the bcrypt worker pool, inside a `password_slot`.
+
+    :param password: The plain text password.
+    :param hashed_password: The stored hash.
+    :return: Whether the password matches, and a new hash to store when the
+        stored one was made with another cost factor.
+    """
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
@@ -0,0 +1,81 @@
+import asyncio
+import functools
+from collections.abc import Awaitable, Callable, Hashable
+from core.replicas import wrote_recently
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    callers with the same key wait for its result instead of making their own.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Run `fn`, or wait for the call already running for `key`.
+
+        :param key: Identifies the call; equal keys must produce equal results.
+        :param fn: The call to run when none is in flight for the key.
+        :return: The result of the call, shared with every concurrent caller.
+        """
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            # A waiter cancelled on its own is not propagated to the call it shares
+            await asyncio.wait([future])
+            if not future.cancelled():
+                self.shared += 1
+                return future.result()
+            # The caller running it was cancelled; run it again
+
+        future = asyncio.get_running_loop().create_future()
+        # The exception is retrieved even when nobody was waiting for it
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+        self.calls += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "calls": self.calls, "queries_saved": self.shared}
+
+
+# The single-flight group of this worker
+flights = SingleFlight()
+
+
+def singleflight(method):
+    """
+    Coalesce concurrent calls of a read-only service method with the same arguments.
+
+    The result is shared between requests, so it must not be a session-bound ORM
+    object. Calls made in a session that has written, or by a client that wrote
+    recently, bypass coalescing so they read their own writes.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if self.session.info.get("wrote") or wrote_recently():
+            return await method(self, *args, **kwargs)
+        # Calls only share results read from the same replica as their session, so a
+        # request never mixes rows from another replica with its own reads
+        replica = self.session.info.get("replica")
+        key = (method.__qualname__, replica.name if replica else None, args, frozenset(kwargs.items()))
+        return await flights.do(key, lambda: method(self, *args, **kwargs))
+    return wrapper
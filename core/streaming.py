@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Number of rows fetched per round trip from the server-side cursor of an export
+EXPORT_BATCH_SIZE = 1000
+# Serialized rows are sent to the client in chunks of about this many characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+async def stream_scalars(session: AsyncSession, query: Select) -> AsyncIterator:
+    """
+    Stream the entities of a query through a server-side cursor.
+
+    The response is streamed after the request's unit of work has closed the
+    session, so the session is opened and closed here.
+
+    :param session: The session of the request.
+    :param query: The query, with `yield_per` set to EXPORT_BATCH_SIZE.
+    :return: An async iterator over the entities.
+    """
+    async with session:
+        async for entity in await session.stream_scalars(query):
+            yield entity
+
+
+async def ndjson_lines(rows: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    """
+    Serialize rows as newline-delimited JSON.
+
+    :param rows: The rows to serialize.
+    :return: An async iterator over the lines.
+    """
+    async for row in rows:
+        yield row.model_dump_json() + "\n"
+
+
+async def csv_lines(rows: AsyncIterator[BaseModel], schema: type[BaseModel]) -> AsyncIterator[str]:
+    """
+    Serialize rows as CSV with a header row. Nested values are written as JSON.
+
+    :param rows: The rows to serialize.
+    :param schema: The schema of the rows, which gives the columns.
+    :return: An async iterator over the lines.
+    """
+    columns = list(schema.model_fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    async for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        values = row.model_dump(mode="json")
+        writer.writerow([
+            json.dumps(values[column]) if isinstance(values[column], (list, dict)) else values[column]
+            for column in columns
+        ])
+        yield buffer.getvalue()
+
+
+async def chunked(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Join lines into larger chunks so each row does not cost a separate send.
+
+    :param lines: The lines to join.
+    :return: An async iterator over the chunks.
+    """
+    chunk, length = [], 0
+    async for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def export_response(rows: AsyncIterator[BaseModel], schema: type[BaseModel], format: str, name: str) -> StreamingResponse:
+    """
+    Stream rows to the client as an NDJSON or CSV attachment.
+
+    :param rows: The rows to export.
+    :param schema: The schema of the rows.
+    :param format: Either "ndjson" or "csv".
+    :param name: The base name of the downloaded file.
+    :return: The streaming response.
+    """
+    if format == "csv":
+        content, media_type = csv_lines(rows, schema), "text/csv"
+    else:
+        content, media_type = ndjson_lines(rows), "application/x-ndjson"
+    return StreamingResponse(
+        chunked(content),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
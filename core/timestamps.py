@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Annotated
+from pydantic import AfterValidator
+
+
+def to_naive(value: datetime) -> datetime:
+    """
+    Convert a datetime to the naive local time held by the timestamp columns,
+    which are written with `datetime.now()`.
+
+    :param value: A naive or timezone-aware datetime.
+    :return: The naive datetime; naive values are returned as they are.
+    """
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+# A datetime parameter that can be compared with the timestamp columns; values sent
+# with an offset, e.g. 2026-01-01T00:00:00Z, would otherwise fail in asyncpg
+Timestamp = Annotated[datetime, AfterValidator(to_naive)]
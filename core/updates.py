@@ -0,0 +1,46 @@
+from datetime import datetime
+from pydantic import field_validator
+from sqlalchemy import Update, update
+from sqlalchemy.exc import IntegrityError
+from core.models import Base
+
+
+def update_by_id(model: type[Base], entity_id: int, values: dict) -> Update:
+    """
+    Build the UPDATE statement of a partial update of one row.
+
+    updated_at is always set, so the statement is valid even when no field was sent.
+
+    :param model: The model of the row.
+    :param entity_id: The ID of the row.
+    :param values: The column values to set.
+    :return: The statement, to which the caller adds its RETURNING clause.
+    """
+    return update(model).where(model.id == entity_id).values(**values, updated_at=datetime.now())
+
+
+def not_null(*fields: str):
+    """
+    Build a validator of a Patch schema rejecting an explicit null for fields whose
+    columns are NOT NULL. Omitted fields keep their default and are not validated,
+    so they are still left unchanged.
+
+    :param fields: The names of the fields.
+    :return: The validator, to assign to an attribute of the schema.
+    """
+    def check(cls, value):
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+    return field_validator(*fields)(classmethod(check))
+
+
+def violated_constraint(error: IntegrityError) -> str | None:
+    """
+    Retrieve the name of the constraint an INSERT or UPDATE violated.
+
+    :param error: The error raised by the statement.
+    :return: The constraint name, or None when the database did not report one.
+    """
+    return getattr(error.orig.__cause__, "constraint_name", None)
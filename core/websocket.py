@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to a client evicted for falling behind (1013: try again later)
+LAGGING_CLOSE_CODE = 1013
+# Seconds allowed for the close frame of an evicted client before giving up on it
+CLOSE_TIMEOUT = 1.0
+# Seconds over which the message rate of a room is measured
+RATE_WINDOW = 10.0
+
+
+class Subscriber:
+    """
+    A connected WebSocket with its bounded queue of messages waiting to be sent.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.task: asyncio.Task | None = None
+        self.rooms: set[str] = set()
+
+
+class Room:
+    """
+    The local members of a chat room and its message counters.
+    """
+
+    def __init__(self):
+        self.members: set[WebSocket] = set()
+        self.messages = 0
+        self._window_start = time.monotonic()
+        self._window_messages = 0
+        self._rate = 0.0
+
+    def record_message(self) -> None:
+        self.messages += 1
+        self._window_messages += 1
+        self.rate()
+
+    def rate(self) -> float:
+        # Messages per second over the last complete window
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= RATE_WINDOW:
+            self._rate = self._window_messages / elapsed
+            self._window_start += elapsed
+            self._window_messages = 0
+        return self._rate
+
+
+class ConnectionManager:
+    """
+    Manages WebSocket connections and fans messages out to them.
+
+    Every connection has its own send queue drained by its own writer task, so a
+    broadcast only enqueues and a slow client never delays the others. A client
+    whose queue fills up has fallen too far behind and is disconnected.
+
+    Connections may join named rooms; a broadcast to a room only touches the
+    members of that room, found through a room to connections index.
+    """
+
+    def __init__(self, queue_size: int | None = None):
+        """
+        :param queue_size: The number of unsent messages after which a client is
+            evicted, WS_SEND_QUEUE_SIZE by default.
+        """
+        self.queue_size = queue_size or settings.WS_SEND_QUEUE_SIZE
+        self.active_connections: dict[WebSocket, Subscriber] = {}
+        self.rooms: dict[str, Room] = {}
+        self.evicted = 0
+        # Close frames being sent to evicted clients, referenced so they are not garbage collected
+        self._closing: set[asyncio.Task] = set()
+
+    async def connect(self, websocket: WebSocket, room: str | None = None) -> None:
+        """
+        Accept a WebSocket connection and start its writer task.
+
+        :param websocket: The connecting WebSocket.
+        :param room: A room to join right away, if any.
+        """
+        await websocket.accept()
+        subscriber = Subscriber(websocket, self.queue_size)
+        subscriber.task = asyncio.create_task(self._write(subscriber))
+        self.active_connections[websocket] = subscriber
+        if room is not None:
+            self.join(websocket, room)
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        """
+        Forget a WebSocket connection, leave its rooms and stop its writer task.
+        Safe to call twice.
+
+        :param websocket: The disconnected WebSocket.
+        """
+        subscriber = self.active_connections.pop(websocket, None)
+        if subscriber is None:
+            return
+        for room in list(subscriber.rooms):
+            self.leave(websocket, room)
+        if subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    def join(self, websocket: WebSocket, room: str) -> None:
+        """
+        Add a connected WebSocket to a room.
+
+        :param websocket: The WebSocket.
+        :param room: The room name.
+        """
+        subscriber = self.active_connections.get(websocket)
+        if subscriber is not None:
+            self.rooms.setdefault(room, Room()).members.add(websocket)
+            subscriber.rooms.add(room)
+
+    def leave(self, websocket: WebSocket, room: str) -> None:
+        """
+        Remove a WebSocket from a room, dropping the room once it is empty.
+
+        :param websocket: The WebSocket.
+        :param room: The room name.
+        """
+        subscriber = self.active_connections.get(websocket)
+        if subscriber is not None:
+            subscriber.rooms.discard(room)
+        chat_room = self.rooms.get(room)
+        if chat_room is not None:
+            chat_room.members.discard(websocket)
+            if not chat_room.members:
+                del self.rooms[room]
+
+    async def send_personal_message(self, message: str, websocket: WebSocket) -> None:
+        """
+        Queue a message for a single WebSocket.
+
+        :param message: The message to send.
+        :param websocket: The recipient.
+        """
+        subscriber = self.active_connections.get(websocket)
+        if subscriber is not None:
+            self._enqueue(subscriber, message)
+
+    def broadcast(self, message: str, room: str | None = None) -> None:
+        """
+        Queue a message for every connected WebSocket, or every member of a room,
+        without waiting for any send. Being synchronous, it can be subscribed to a
+        backplane channel directly.
+
+        :param message: The message to send.
+        :param room: The room to send to, None for every connection.
+        """
+        if room is None:
+            recipients = list(self.active_connections)
+        else:
+            chat_room = self.rooms.get(room)
+            if chat_room is None:
+                return
+            chat_room.record_message()
+            recipients = list(chat_room.members)
+        for websocket in recipients:
+            subscriber = self.active_connections.get(websocket)
+            if subscriber is not None:
+                self._enqueue(subscriber, message)
+
+    def _enqueue(self, subscriber: Subscriber, message: str) -> None:
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.evicted += 1
+            logger.info("Evicting a WebSocket client %d messages behind", subscriber.queue.qsize())
+            self.disconnect(subscriber.websocket)
+            task = asyncio.create_task(self._close(subscriber.websocket))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _write(self, subscriber: Subscriber) -> None:
+        # Drain the queue of one connection; a failed send means the client is gone
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                await subscriber.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(subscriber.websocket)
+
+    async def _close(self, websocket: WebSocket) -> None:
+        if websocket.application_state != WebSocketState.CONNECTED:
+            return
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=LAGGING_CLOSE_CODE, reason="Too far behind"), CLOSE_TIMEOUT
+            )
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        depths = [subscriber.queue.qsize() for subscriber in self.active_connections.values()]
+        return {
+            "connections": len(depths),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "evicted": self.evicted,
+            "rooms": {
+                name: {"members": len(room.members), "messages": room.messages, "rate": room.rate()}
+                for name, room in self.rooms.items()
+            },
+        }
@@ -1,18 +1,42 @@
+import asyncio
+import json
 from fastapi import FastAPI, WebSocket
 from core.connections import Connection
+from core.idempotency import IdempotencyMiddleware, idempotency_cache
+from core.jwt import token_cache
+from core.pubsub import backplane
+from core.replicas import ClientKeyMiddleware
+from core.singleflight import flights
+from core.websocket import ConnectionManager
 from apps.users.routers import router as users_router
+from apps.users.services import user_cache
+from apps.carts.routers import router as carts_router
+from apps.carts.services import run_cart_flusher
+from apps.carts.store import cart_store
 from apps.categories.routers import router as categories_router
+from apps.orders.feed import start_order_feed, stop_order_feed
 from apps.orders.routers import router as orders_router
 from apps.products.routers import router as products_router
 from fastapi import WebSocketDisconnect
-from typing import List
 
 
 # Define an asynchronous lifespan function for the FastAPI app
 async def lifespan(app: FastAPI):
     # Initialize a connection and store it in the app's state
     app.state.connection = Connection()
+    await app.state.connection.start()
+    # Relay chat messages published by any worker to the sockets of this one
+    backplane.subscribe("chat", relay_chat)
+    await start_order_feed()
+    await backplane.start()
+    # Persist the carts edited in memory in the background
+    cart_flusher = asyncio.create_task(run_cart_flusher())
     yield
+    cart_flusher.cancel()
+    await asyncio.gather(cart_flusher, return_exceptions=True)
+    await backplane.close()
+    stop_order_feed()
+    backplane.unsubscribe("chat", relay_chat)
     # Close the connection when the app shuts down
     await app.state.connection.close()
 
@@ -24,6 +48,15 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Replay the first response to create requests retried with the same Idempotency-Key
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths={"/orders/", "/products/", "/categories", "/users/registration", "/carts/checkout"},
+)
+# Identify the client of each request so its reads follow its own writes; added
+# last so it wraps the idempotency middleware, which scopes its keys by client
+app.add_middleware(ClientKeyMiddleware)
+
 # Define a root endpoint that returns a welcome message
 @app.get("/")
 async def read_root():
@@ -34,52 +67,67 @@ async def read_root():
 async def health():
     return {"status": "ok"}
 
-# Class to manage WebSocket connections
-class ConnectionManager:
-    def __init__(self):
-        # List to keep track of active WebSocket connections
-        self.active_connections: List[WebSocket] = []
-
-    # Method to accept and store a new WebSocket connection
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Define a database pool health endpoint, used to size the pool against the worker count
+@app.get("/health/db")
+async def health_db():
+    return Connection().pool_status()
 
-    # Method to remove a WebSocket connection
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# Define an in-process cache health endpoint with the hit and miss counters of each cache
+@app.get("/health/cache")
+async def health_cache():
+    return {
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats(),
+        "carts": cart_store.stats(),
+        "idempotency": idempotency_cache.stats(),
+        "singleflight": flights.stats(),
+    }
 
-    # Method to send a personal message to a specific WebSocket
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    # Method to broadcast a message to all active WebSocket connections
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+# Define a WebSocket health endpoint with the connection count and send queue depths
+@app.get("/health/ws")
+async def health_ws():
+    return {**manager.stats(), "backplane": backplane.stats()}
 
 # Instantiate the connection manager
 manager = ConnectionManager()
+# The room of clients connecting to /ws/chat without naming one
+LOBBY = "lobby"
+
 
-# WebSocket endpoint for chat functionality
+# Chat messages travel between workers as {"room": ..., "text": ...} on the "chat" channel
+def publish_chat(room: str, text: str) -> None:
+    backplane.publish("chat", json.dumps({"room": room, "text": text}))
+
+
+def relay_chat(message: str) -> None:
+    # Workers with no member in the room skip the message after one dict lookup
+    data = json.loads(message)
+    manager.broadcast(data["text"], data["room"])
+
+# WebSocket endpoints for chat functionality; /ws/chat is the lobby room
 @app.websocket("/ws/chat")
 async def websocket_chat_endpoint(websocket: WebSocket):
-    # Connect the WebSocket
-    await manager.connect(websocket)
+    await websocket_chat_room_endpoint(websocket, LOBBY)
+
+@app.websocket("/ws/chat/{room}")
+async def websocket_chat_room_endpoint(websocket: WebSocket, room: str):
+    # Connect the WebSocket and join its room
+    await manager.connect(websocket, room)
     try:
         while True:
             # Receive a message from the WebSocket
             data = await websocket.receive_text()
-            # Broadcast the received message to all connections
-            await manager.broadcast(f"Client says: {data}")
+            # Broadcast the received message to the room's members on every worker
+            publish_chat(room, f"Client says: {data}")
     except WebSocketDisconnect:
         # Handle disconnection
         manager.disconnect(websocket)
-        await manager.broadcast("A client disconnected")
+        publish_chat(room, "A client disconnected")
 
 # Include routers for different app modules
 app.include_router(users_router, prefix="/users", tags=["users"])
 app.include_router(categories_router, tags=["categories"])
 app.include_router(orders_router, prefix="/orders", tags=["orders"])
 app.include_router(products_router, prefix="/products", tags=["products"])
+app.include_router(carts_router, prefix="/carts", tags=["carts"])
 
@@ -0,0 +1,71 @@
+"""
+Broadcast through ConnectionManager to 10,000 simulated WebSocket clients, one
+in a hundred of them slow, and report the delivery latency of the others and
+the time a broadcast call takes.
+
+Run from the repository root:
+
+    python -m scripts.bench_broadcast
+"""
+import asyncio
+import time
+from starlette.websockets import WebSocketState
+from core.websocket import ConnectionManager
+from scripts.benchtools import report
+
+CLIENTS = 10000
+SLOW_EVERY = 100
+SLOW_SEND = 1.0
+MESSAGES = 20
+MESSAGE_INTERVAL = 0.01
+QUEUE_SIZE = 10
+
+
+class SimulatedWebSocket:
+    """
+    Stands in for a client connection, recording when each message is delivered.
+    """
+
+    def __init__(self, slow: bool, latencies: list[float]):
+        self.slow = slow
+        self.latencies = latencies
+        self.application_state = WebSocketState.CONNECTED
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, message: str) -> None:
+        if self.slow:
+            await asyncio.sleep(SLOW_SEND)
+        else:
+            self.latencies.append(time.perf_counter() - float(message))
+
+    async def close(self, code: int, reason: str) -> None:
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+async def main() -> None:
+    manager = ConnectionManager(queue_size=QUEUE_SIZE)
+    latencies = []
+    for i in range(CLIENTS):
+        await manager.connect(SimulatedWebSocket(i % SLOW_EVERY == 0, latencies))
+
+    calls = []
+    for _ in range(MESSAGES):
+        start = time.perf_counter()
+        manager.broadcast(str(start))
+        calls.append(time.perf_counter() - start)
+        await asyncio.sleep(MESSAGE_INTERVAL)
+    # Let the fast clients drain their queues
+    await asyncio.sleep(0.5)
+
+    report(f"broadcast call, {CLIENTS} clients", calls)
+    report("delivery latency, fast clients", latencies)
+    stats = manager.stats()
+    print(f"delivered {len(latencies)}, evicted {stats['evicted']}, still queued {stats['queued']}")
+    for websocket in list(manager.active_connections):
+        manager.disconnect(websocket)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Measure the latency of an unrelated database-backed endpoint while a storm of
+logins hashes passwords with bcrypt. Hashing runs on the bounded
+PASSWORD_HASH_WORKERS pool, so the event loop keeps serving other requests, and
+no pooled connection is held while a hash runs, so the other requests still get
+one; logins beyond PASSWORD_HASH_QUEUE are refused with 503 instead of piling up.
+
+Run from the repository root against a migrated database:
+
+    python -m scripts.bench_login_storm
+"""
+import asyncio
+import time
+from collections import Counter
+from scripts.benchtools import registered_user, report, running_app
+
+PROBE_INTERVAL = 0.01
+STORM_SECONDS = 10.0
+CONCURRENT_LOGINS = 50
+
+
+async def probe(client, headers: dict, seconds: float) -> list[float]:
+    # Request an endpoint reading the database but not needing bcrypt at a steady pace
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        (await client.get("/products/", params={"size": 1}, headers=headers)).raise_for_status()
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(PROBE_INTERVAL)
+    return samples
+
+
+async def storm(client, username: str, password: str, until: float, statuses: Counter) -> None:
+    while time.perf_counter() < until:
+        response = await client.post("/users/authentication", json={"username": username, "password": password})
+        statuses[response.status_code] += 1
+
+
+async def main() -> None:
+    async with running_app() as client, registered_user(client) as (username, password, headers):
+        report("GET /products, idle", await probe(client, headers, STORM_SECONDS / 2))
+        waits = (await client.get("/health/db")).json()["waits"]
+
+        statuses = Counter()
+        until = time.perf_counter() + STORM_SECONDS
+        logins = [
+            asyncio.create_task(storm(client, username, password, until, statuses))
+            for _ in range(CONCURRENT_LOGINS)
+        ]
+        report(
+            f"GET /products, {CONCURRENT_LOGINS} concurrent logins", await probe(client, headers, STORM_SECONDS)
+        )
+        await asyncio.gather(*logins)
+        print("login responses by status:", dict(statuses))
+        pool = (await client.get("/health/db")).json()
+        print(f"pool checkouts that waited during the storm: {pool['waits'] - waits}, timed out: {pool['timeouts']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+"""
+Compare fetching products one request at a time, sequentially and concurrently,
+with a single request to the /products/batch multi-get endpoint.
+
+Run from the repository root against a migrated database holding some products:
+
+    python -m scripts.bench_multiget
+"""
+import asyncio
+from scripts.benchtools import registered_user, report, running_app, timed
+
+IDS = 40
+RUNS = 20
+
+
+async def main() -> None:
+    async with running_app() as client, registered_user(client) as (username, password, headers):
+        response = await client.get("/products/", params={"size": IDS}, headers=headers)
+        response.raise_for_status()
+        ids = [product["id"] for product in response.json()["items"]]
+        if not ids:
+            raise SystemExit("No products to fetch")
+
+        async def sequential():
+            for product_id in ids:
+                (await client.get(f"/products/{product_id}", headers=headers)).raise_for_status()
+
+        async def concurrent():
+            responses = await asyncio.gather(
+                *(client.get(f"/products/{product_id}", headers=headers) for product_id in ids)
+            )
+            for response in responses:
+                response.raise_for_status()
+
+        async def batch():
+            response = await client.get("/products/batch", params={"ids": ",".join(map(str, ids))}, headers=headers)
+            response.raise_for_status()
+
+        for _ in range(2):
+            # The first round warms the caches and the connection pools
+            report(f"{len(ids)} sequential GET /products/{{id}}", await timed(RUNS, sequential))
+            report(f"{len(ids)} concurrent GET /products/{{id}}", await timed(RUNS, concurrent))
+            report(f"GET /products/batch with {len(ids)} ids", await timed(RUNS, batch))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+Measure order creation throughput on one connection with 1, 10 and 100 line
+items per order, together with the statements each order costs.
+
+Run from the repository root against a migrated database:
+
+    python -m scripts.bench_order_create
+"""
+import asyncio
+import time
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from apps.orders.schemas import OrderCreate
+from apps.orders.services import OrderService
+from core.models import Product, User
+from scripts.benchtools import report, seeded_connection
+
+ORDERS = 500
+ITEMS_PER_ORDER = [1, 10, 100]
+
+
+async def main() -> None:
+    async with seeded_connection(users=1000, categories=10, products=10000) as connection:
+        user_id = await connection.scalar(select(User.id).order_by(User.id.desc()).limit(1))
+        product_ids = list(await connection.scalars(select(Product.id).order_by(Product.id.desc()).limit(100)))
+        statements = []
+        event.listen(connection.sync_connection, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        for items in ITEMS_PER_ORDER:
+            order = OrderCreate(user_id=user_id, product_ids=product_ids[:items])
+            samples = []
+            statements.clear()
+            start = time.perf_counter()
+            for _ in range(ORDERS):
+                # Each order gets its own session, like a request does
+                async with AsyncSession(bind=connection) as session:
+                    began = time.perf_counter()
+                    await OrderService(session).create_order(order)
+                    samples.append(time.perf_counter() - began)
+            elapsed = time.perf_counter() - start
+            report(f"create order with {items} items", samples)
+            print(f"{'':<40} {ORDERS / elapsed:.0f} orders/s, {len(statements) / ORDERS:.0f} statements per order")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Compare the latency of the first and the 10,000th page of the product and
+order lists. With keyset pagination both cost one index range scan; the OFFSET
+query the lists used before is timed alongside for reference.
+
+Run from the repository root against a migrated database:
+
+    python -m scripts.bench_pagination
+"""
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from apps.orders.services import OrderService
+from apps.products.services import ProductService
+from core.models import Order, Product
+from core.pagination import encode_cursor
+from scripts.benchtools import report, seeded_connection, timed
+
+PAGE_SIZE = 20
+DEEP_PAGE = 10000
+RUNS = 200
+
+
+async def main() -> None:
+    rows = PAGE_SIZE * DEEP_PAGE + PAGE_SIZE
+    skipped = PAGE_SIZE * (DEEP_PAGE - 1)
+    sizes = {"users": 1000, "categories": 10, "products": rows, "orders": rows, "items_per_order": 1}
+    async with seeded_connection(**sizes) as connection:
+        # Every run uses a new session, so no result is memoized between runs
+        async def list_products(cursor: str | None):
+            async with AsyncSession(bind=connection) as session:
+                return await ProductService(session).get_products(cursor, PAGE_SIZE)
+
+        async def list_orders(cursor: str | None):
+            async with AsyncSession(bind=connection) as session:
+                return await OrderService(session).get_orders(cursor, PAGE_SIZE)
+
+        async def offset_products():
+            async with AsyncSession(bind=connection) as session:
+                query = select(Product).order_by(Product.id).offset(skipped).limit(PAGE_SIZE)
+                return (await session.scalars(query)).all()
+
+        last_id = await connection.scalar(select(Product.id).order_by(Product.id).offset(skipped - 1).limit(1))
+        deep_cursor = encode_cursor(last_id)
+        report("products page 1", await timed(RUNS, lambda: list_products(None)))
+        report(f"products page {DEEP_PAGE}", await timed(RUNS, lambda: list_products(deep_cursor)))
+        report(f"products page {DEEP_PAGE} with OFFSET", await timed(RUNS, offset_products))
+
+        last = (await connection.execute(
+            select(Order.created_at, Order.id)
+            .order_by(Order.created_at.desc(), Order.id.desc())
+            .offset(skipped - 1)
+            .limit(1)
+        )).one()
+        deep_cursor = encode_cursor(*last)
+        report("orders page 1", await timed(RUNS, lambda: list_orders(None)))
+        report(f"orders page {DEEP_PAGE}", await timed(RUNS, lambda: list_orders(deep_cursor)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
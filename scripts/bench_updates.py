@@ -0,0 +1,47 @@
+"""
+Compare the latency of a product PATCH done as one UPDATE ... RETURNING with the
+select, assign, flush and refresh sequence the services used before.
+
+Run from the repository root against a migrated database:
+
+    python -m scripts.bench_updates
+"""
+import asyncio
+import itertools
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from apps.products.schemas import ProductPatch
+from apps.products.services import ProductService
+from core.models import Product
+from scripts.benchtools import report, seeded_connection, timed
+
+RUNS = 1000
+
+
+async def main() -> None:
+    async with seeded_connection(categories=10, products=10000) as connection:
+        product_id = await connection.scalar(select(Product.id).order_by(Product.id.desc()).limit(1))
+        # Every run sets another price, so the flush always has a change to write
+        prices = itertools.count(1)
+
+        async def set_based():
+            async with AsyncSession(bind=connection) as session:
+                return await ProductService(session).patch_product(product_id, ProductPatch(price=next(prices)))
+
+        async def select_then_flush():
+            async with AsyncSession(bind=connection) as session:
+                product = await session.get(Product, product_id)
+                for field, value in ProductPatch(price=next(prices)).model_dump(exclude_unset=True).items():
+                    setattr(product, field, value)
+                await session.flush()
+                await session.refresh(product)
+                return product
+
+        for _ in range(2):
+            # The first round warms the statement caches
+            report("PATCH as UPDATE ... RETURNING", await timed(RUNS, set_based))
+            report("PATCH as SELECT, flush, refresh", await timed(RUNS, select_then_flush))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
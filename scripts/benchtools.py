@@ -0,0 +1,190 @@
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+import httpx
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from core.config import settings
+from core.models import User
+
+
+async def seed(
+        connection: AsyncConnection,
+        users: int = 0,
+        categories: int = 0,
+        products: int = 0,
+        orders: int = 0,
+        items_per_order: int = 0
+) -> None:
+    """
+    Insert generated rows with generate_series and ANALYZE the tables.
+
+    Products are spread over the seeded categories, orders over the seeded users
+    and line items over the seeded products, so those must be seeded too.
+
+    :param connection: The connection to seed through, usually inside a transaction rolled back afterwards.
+    :param users: The number of users to insert.
+    :param categories: The number of categories to insert.
+    :param products: The number of products to insert.
+    :param orders: The number of orders to insert, one minute apart going back from now.
+    :param items_per_order: The number of line items of each order.
+    """
+    # Rolled-back seeds leave dead rows behind, and a VACUUM running meanwhile would
+    # overwrite the row estimates of ANALYZE with the committed counts; the lock keeps
+    # (auto)vacuum off these tables until the transaction ends
+    await connection.exec_driver_sql(
+        "LOCK TABLE users, categories, products, orders, order_products IN SHARE UPDATE EXCLUSIVE MODE"
+    )
+    if users:
+        await connection.exec_driver_sql(f"""
+            INSERT INTO users (email, username, password, is_active, is_verified, role, created_at, updated_at)
+            SELECT 'seed' || i || '@example.com', 'seed' || i, 'x', true, false, 'user', now(), now()
+            FROM generate_series(1, {users}) AS i
+        """)
+    if categories:
+        await connection.exec_driver_sql(f"""
+            INSERT INTO categories (name, is_active, created_at, updated_at)
+            SELECT 'category ' || i, true, now(), now()
+            FROM generate_series(1, {categories}) AS i
+        """)
+    if products:
+        await connection.exec_driver_sql(f"""
+            INSERT INTO products (name, price, category_id, is_active, created_at, updated_at)
+            SELECT 'product ' || i, i % 100 + 1, seeded.ids[1 + i % {categories}], true, now(), now()
+            FROM generate_series(1, {products}) AS i
+            CROSS JOIN (
+                SELECT array_agg(id) AS ids FROM (SELECT id FROM categories ORDER BY id DESC LIMIT {categories}) AS c
+            ) AS seeded
+        """)
+    if orders:
+        await connection.exec_driver_sql(f"""
+            INSERT INTO orders (user_id, is_active, created_at, updated_at)
+            SELECT seeded.ids[1 + i % {users}], true, now() - i * interval '1 minute', now()
+            FROM generate_series(1, {orders}) AS i
+            CROSS JOIN (
+                SELECT array_agg(id) AS ids FROM (SELECT id FROM users ORDER BY id DESC LIMIT {users}) AS u
+            ) AS seeded
+        """)
+    if orders and items_per_order:
+        await connection.exec_driver_sql(f"""
+            INSERT INTO order_products (order_id, product_id, is_active, created_at, updated_at)
+            SELECT o.id, seeded.ids[1 + (o.id * {items_per_order} + n) % {products}], true, now(), now()
+            FROM (SELECT id FROM orders ORDER BY id DESC LIMIT {orders}) AS o
+            CROSS JOIN generate_series(1, {items_per_order}) AS n
+            CROSS JOIN (
+                SELECT array_agg(id) AS ids FROM (SELECT id FROM products ORDER BY id DESC LIMIT {products}) AS p
+            ) AS seeded
+        """)
+    await connection.exec_driver_sql("ANALYZE users, categories, products, orders, order_products")
+
+
+@asynccontextmanager
+async def seeded_connection(**sizes):
+    """
+    Open a connection to the configured database and seed it inside a transaction
+    that is rolled back on exit, so a benchmark leaves no rows behind.
+
+    :param sizes: The row counts passed to `seed`.
+    :return: The connection.
+    """
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                await seed(connection, **sizes)
+                yield connection
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def running_app(port: int = 8799):
+    """
+    Run the application in a uvicorn process of its own, so the load a benchmark
+    generates does not compete with the server for the event loop.
+
+    :param port: The port to listen on.
+    :return: An HTTP client for the application.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            while True:
+                try:
+                    await client.get("/health")
+                    break
+                except httpx.TransportError:
+                    if process.returncode is not None:
+                        raise RuntimeError("The application did not start")
+                    await asyncio.sleep(0.1)
+            yield client
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+@asynccontextmanager
+async def registered_user(client: httpx.AsyncClient):
+    """
+    Register a throwaway user through the API and delete it on exit.
+
+    :param client: The client of the running application.
+    :return: The username, the password and the Authorization header of the user.
+    """
+    username, password = f"bench-{uuid.uuid4().hex[:12]}", uuid.uuid4().hex
+    response = await client.post(
+        "/users/registration", json={"email": f"{username}@example.com", "username": username, "password": password}
+    )
+    response.raise_for_status()
+    try:
+        response = await client.post("/users/authentication", json={"username": username, "password": password})
+        response.raise_for_status()
+        yield username, password, {"Authorization": f"Bearer {response.json()['access_token']}"}
+    finally:
+        engine = create_async_engine(settings.DATABASE_URL)
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(delete(User).where(User.username == username))
+        finally:
+            await engine.dispose()
+
+
+async def timed(runs: int, call: Callable[[], Awaitable]) -> list[float]:
+    """
+    Await a call several times in a row.
+
+    :param runs: The number of runs.
+    :param call: The call to time.
+    :return: The duration of each run in seconds.
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label: str, seconds: list[float]) -> None:
+    """
+    Print the latency distribution of timed runs in milliseconds.
+
+    :param label: What was timed.
+    :param seconds: The duration of each run.
+    """
+    ms = sorted(value * 1000 for value in seconds)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(
+        f"{label:<40} n={len(ms):<6} mean {statistics.fmean(ms):8.3f} ms"
+        f"  p50 {statistics.median(ms):8.3f} ms  p99 {p99:8.3f} ms"
+    )
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from core.config import settings
+from scripts.benchtools import seed
+
+# Rows seeded per table, enough for the planner to prefer an index wherever one applies
+SEED_USERS = 20000
+SEED_CATEGORIES = 50
+# An order page looks up a few hundred products by ID; that stays selective only on a large table
+SEED_PRODUCTS = 200000
+SEED_ORDERS = 100000
+SEED_ITEMS_PER_ORDER = 3
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def connection():
+    """
+    A connection to the database configured in the settings, inside a transaction
+    holding the seeded dataset. The transaction is rolled back after the tests, so
+    nothing is left behind. Tests needing the database are skipped when it is unreachable.
+    """
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        connection = await engine.connect()
+    except (OSError, ConnectionError) as e:
+        await engine.dispose()
+        pytest.skip(f"Database unavailable: {e}")
+    transaction = await connection.begin()
+    try:
+        await seed(
+            connection,
+            users=SEED_USERS,
+            categories=SEED_CATEGORIES,
+            products=SEED_PRODUCTS,
+            orders=SEED_ORDERS,
+            items_per_order=SEED_ITEMS_PER_ORDER
+        )
+        yield connection
+    finally:
+        await transaction.rollback()
+        await connection.close()
+        await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+async def seeded(connection) -> dict:
+    """
+    IDs and names of seeded rows for the queries to look up.
+    """
+    user_id = await connection.scalar(text("SELECT max(user_id) FROM orders"))
+    return {
+        "user_id": user_id,
+        "username": await connection.scalar(text("SELECT username FROM users WHERE id = :id"), {"id": user_id}),
+        "email": await connection.scalar(text("SELECT email FROM users WHERE id = :id"), {"id": user_id}),
+        "order_id": await connection.scalar(text("SELECT max(id) FROM orders")),
+        "product_ids": list(await connection.scalars(text("SELECT id FROM products ORDER BY id DESC LIMIT 20"))),
+    }
+
+
+@pytest.fixture
+async def session(connection):
+    """
+    A session bound to the seeded connection; its changes are discarded with the seed.
+    """
+    async with AsyncSession(bind=connection, expire_on_commit=False) as session:
+        yield session
+
+
+@pytest.fixture
+def statements(connection):
+    """
+    The (statement, parameters) pairs sent to the database while the test runs.
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(connection.sync_connection, "before_cursor_execute", record)
+    yield executed
+    event.remove(connection.sync_connection, "before_cursor_execute", record)
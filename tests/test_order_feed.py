@@ -0,0 +1,63 @@
+import json
+from apps.orders.feed import OrderFeed, format_position, parse_position
+from core.config import settings
+
+
+def feed_after(seq: int, buffer_size: int = 100) -> OrderFeed:
+    feed = OrderFeed(buffer_size)
+    feed.floor = feed.seq = seq
+    return feed
+
+
+def publish(feed: OrderFeed, seq: int, user_id: int = 1) -> str:
+    feed.handle(json.dumps({"seq": seq, "type": "created", "order_id": seq, "user_id": user_id}))
+    return feed.recent[-1]["position"]
+
+
+def test_position_round_trip():
+    assert format_position(12, {}) == "12"
+    assert format_position(12, {10: 0.0, 9: 0.0}) == "12:9,10"
+    assert parse_position("12") == (12, set())
+    assert parse_position("12:9,10") == (12, {9, 10})
+
+
+def test_late_event_is_replayed():
+    feed = feed_after(4)
+    position = publish(feed, 6)
+    assert position == "6:5"
+    # The transaction drawing 5 commits after the one drawing 6
+    assert publish(feed, 5) == "6"
+    assert [event["seq"] for event in feed.replay(parse_position(position), None)] == [5]
+
+
+def test_replay_follows_arrival_order():
+    feed = feed_after(4)
+    position = publish(feed, 5)
+    publish(feed, 7)
+    publish(feed, 6)
+    assert [event["seq"] for event in feed.replay(parse_position(position), None)] == [7, 6]
+
+
+def test_replay_filters_by_user():
+    feed = feed_after(4)
+    position = publish(feed, 6, user_id=1)
+    publish(feed, 5, user_id=2)
+    assert feed.replay(parse_position(position), 1) == []
+    assert [event["seq"] for event in feed.replay(parse_position(position), 2)] == [5]
+
+
+def test_missing_numbers_expire(monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_FEED_GAP_WINDOW", 0.0)
+    feed = feed_after(4)
+    publish(feed, 6)
+    # 5 was rolled back, so it is given up once the window has passed
+    assert publish(feed, 7) == "7"
+
+
+def test_evicted_missing_number_resets():
+    feed = feed_after(4, buffer_size=2)
+    position = publish(feed, 6)
+    publish(feed, 5)
+    publish(feed, 7)
+    publish(feed, 8)
+    assert feed.replay(parse_position(position), None) is None
@@ -0,0 +1,52 @@
+import pytest
+from apps.categories.services import CategoryService
+from apps.orders.services import OrderService
+from apps.products.services import ProductService
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_order_page_statements(session, statements):
+    page = await OrderService(session).get_orders(None, 100)
+    assert len(page.items) == 100
+    assert any(order.products for order in page.items)
+    # The orders with their product IDs, then their products in one batch
+    assert len(statements) <= 2
+
+
+async def test_next_order_page_statements(session, statements):
+    service = OrderService(session)
+    page = await service.get_orders(None, 100)
+    statements.clear()
+    await service.get_orders(page.next_cursor, 100)
+    assert len(statements) <= 2
+
+
+async def test_orders_of_user_statements(session, statements, seeded):
+    page = await OrderService(session).get_orders(None, 100, user_id=seeded["user_id"])
+    assert all(order.products for order in page.items)
+    assert len(statements) <= 2
+
+
+async def test_order_detail_statements(session, statements, seeded):
+    order = await OrderService(session).get_order_by_id(seeded["order_id"])
+    assert order.products
+    assert len(statements) <= 2
+
+
+async def test_product_statements(session, statements, seeded):
+    service = ProductService(session)
+    assert len((await service.get_products(None, 100)).items) == 100
+    assert len(statements) == 1
+    statements.clear()
+    assert await service.get_product_by_id(seeded["product_ids"][0]) is not None
+    assert len(statements) == 1
+
+
+async def test_category_statements(session, statements):
+    service = CategoryService(session)
+    page = await service.get_categories(None, 10)
+    assert len(statements) == 1
+    statements.clear()
+    assert await service.get_category_by_id(page.items[0].id) is not None
+    assert len(statements) == 1
@@ -0,0 +1,96 @@
+"""
+Query-plan regression checks: every statement a hot service method sends is
+run through EXPLAIN against the seeded dataset, and none may fall back to a
+sequential scan of a large table.
+"""
+import json
+from datetime import datetime, timedelta
+import pytest
+from apps.orders.services import OrderService
+from apps.products.services import ProductService
+from apps.users.services import UserService
+
+pytestmark = pytest.mark.anyio
+
+# Tables that grow with the business; a seq scan on them is a missing or unusable index
+HOT_TABLES = {"users", "products", "orders", "order_products"}
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """
+    Collect the hot tables read by sequential scans anywhere in a plan.
+
+    :param plan: A plan node of EXPLAIN (FORMAT JSON).
+    :return: The names of the scanned tables.
+    """
+    found = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in HOT_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def assert_index_only_access(connection, statements: list) -> None:
+    """
+    EXPLAIN each recorded statement with its parameters and fail on a seq scan of a hot table.
+
+    :param connection: The connection holding the seeded dataset.
+    :param statements: The (statement, parameters) pairs recorded by the `statements` fixture.
+    """
+    assert statements, "the service sent no statement"
+    # EXPLAIN runs on the same connection, so the recorded list is copied before it grows
+    for statement, parameters in list(statements):
+        result = await connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = result.scalar()
+        plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+        assert not seq_scans(plan), f"seq scan on {seq_scans(plan)} for:\n{statement}"
+
+
+async def test_product_pages(connection, session, statements):
+    service = ProductService(session)
+    page = await service.get_products(None, 100)
+    await service.get_products(page.next_cursor, 100)
+    await assert_index_only_access(connection, statements)
+
+
+async def test_products_by_ids(connection, session, statements, seeded):
+    service = ProductService(session)
+    await service.get_products_by_ids(seeded["product_ids"])
+    await service.get_product_by_id(seeded["product_ids"][0] - 1)
+    await assert_index_only_access(connection, statements)
+
+
+async def test_order_pages(connection, session, statements):
+    service = OrderService(session)
+    page = await service.get_orders(None, 100)
+    await service.get_orders(page.next_cursor, 100)
+    await service.get_orders(None, 100, created_from=datetime.now() - timedelta(days=1))
+    await assert_index_only_access(connection, statements)
+
+
+async def test_orders_of_user(connection, session, statements, seeded):
+    service = OrderService(session)
+    page = await service.get_orders(None, 2, user_id=seeded["user_id"])
+    await service.get_orders(page.next_cursor, 2, user_id=seeded["user_id"])
+    await assert_index_only_access(connection, statements)
+
+
+async def test_order_by_id(connection, session, statements, seeded):
+    await OrderService(session).get_order_by_id(seeded["order_id"])
+    await assert_index_only_access(connection, statements)
+
+
+async def test_order_product_validation(connection, session, statements, seeded):
+    await OrderService(session)._get_products(seeded["product_ids"])
+    await assert_index_only_access(connection, statements)
+
+
+async def test_user_lookups(connection, session, statements, seeded):
+    service = UserService(session)
+    await service.get_user_by_username(seeded["username"])
+    await service.get_user_by_email(seeded["email"])
+    await service.get_users_by_ids([seeded["user_id"]])
+    page = await service.get_users(None, 100)
+    await service.get_users(page.next_cursor, 100)
+    await assert_index_only_access(connection, statements)